@@ -0,0 +1,217 @@
+import json
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+from tracking import TRACK_CONF, create_tracker, update_tracker
+from video_source import VideoSource
+from yolo_box_ops import box_iou
+
+# 运动量计算时先把帧缩小到这个尺寸（宽, 高），只需要粗略的全局变化量
+MOTION_SIZE = (64, 36)
+
+
+def _motion_thumbnail(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, MOTION_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def motion_score(reference: np.ndarray, current: np.ndarray) -> float:
+    """两张缩略图的平均绝对差（0-255），用来粗略衡量画面变化了多少。"""
+    return float(np.abs(current - reference).mean())
+
+
+class AdaptiveTracker:
+    """
+    跳帧追踪：检测器只在以下情况运行，其余帧用ByteTrack的卡尔曼滤波预测目标位置：
+      - 距离上一次检测已经过了 stride 帧；
+      - 画面相对上一次检测时的变化量超过 motion_threshold；
+      - 有正在追踪的目标预测不确定度（位置标准差 / 目标高度）超过 uncertainty_threshold。
+    stride=1 时每帧都检测，等价于原来的 model.track（默认检测置信度 conf=TRACK_CONF，与 model.track 相同）。
+    detector(frames) 可以替换默认的 model.predict（例如 roi.ROIDetector），返回每帧的 Results。
+    可以直接作为 run_video_pipeline 的 infer_fn（帧按顺序逐个处理，追踪状态依赖帧的先后顺序）。
+    """
+
+    def __init__(self, model: YOLO, fps: float, stride: int = 3, motion_threshold: float = 12.0,
+                 uncertainty_threshold: float = 0.5, tracker_yaml: str = 'bytetrack.yaml', detector=None,
+                 conf: float = TRACK_CONF):
+        self.model = model
+        self.detector = detector or (lambda frames: model.predict(frames, conf=conf, verbose=False))
+        self.stride = max(int(stride), 1)
+        self.motion_threshold = motion_threshold
+        self.uncertainty_threshold = uncertainty_threshold
+        self.tracker = create_tracker(fps, tracker_yaml)
+        self.frames_since_detect = None
+        self.reference = None
+        self.frames = 0
+        self.detections = 0
+
+    def _uncertain(self) -> bool:
+        for track in self.tracker.tracked_stracks:
+            if track.covariance is None:
+                continue
+            height = max(float(track.mean[3]), 1.0)
+            if np.sqrt(track.covariance[0, 0] + track.covariance[1, 1]) / height > self.uncertainty_threshold:
+                return True
+        return False
+
+    def _should_detect(self, thumbnail: np.ndarray) -> bool:
+        if self.frames_since_detect is None or self.frames_since_detect + 1 >= self.stride:
+            return True
+        if self.motion_threshold is not None and motion_score(self.reference, thumbnail) > self.motion_threshold:
+            return True
+        return self.uncertainty_threshold is not None and self._uncertain()
+
+    def _predicted_results(self, frame: np.ndarray) -> Results:
+        """不跑检测器，把所有追踪中的目标按卡尔曼预测往前推一帧，组装成与 model.track 相同格式的结果。"""
+        tracker = self.tracker
+        tracker.frame_id += 1
+        # 丢失的目标也一起预测，下一次检测时 tracker.update 会从预测后的位置继续匹配
+        tracker.multi_predict(tracker.tracked_stracks + tracker.lost_stracks)
+        rows = [[*t.xyxy, t.track_id, t.score, t.cls] for t in tracker.tracked_stracks if t.is_activated]
+        boxes = torch.as_tensor(np.array(rows, dtype=np.float32).reshape(-1, 7))
+        return Results(frame, path='', names=self.model.names, boxes=boxes)
+
+    def track_frame(self, frame: np.ndarray) -> Results:
+        thumbnail = _motion_thumbnail(frame)
+        self.frames += 1
+        if self._should_detect(thumbnail):
+            results = self.detector([frame])[0]
+            results = update_tracker(self.tracker, results)
+            self.reference = thumbnail
+            self.frames_since_detect = 0
+            self.detections += 1
+            return results
+        self.frames_since_detect += 1
+        return self._predicted_results(frame)
+
+    def __call__(self, frames) -> list:
+        return [self.track_frame(frame) for frame in frames]
+
+    @property
+    def detect_ratio(self) -> float:
+        return self.detections / self.frames if self.frames else 0.0
+
+
+def _box_arrays(results: Results):
+    """只保留一帧结果中的 (xyxy, 类别) 数组；Results 持有原图，留着它等于把整帧留在内存里。"""
+    return results.boxes.xyxy.cpu().numpy(), results.boxes.cls.cpu().numpy()
+
+
+def _match_stats(reference, candidate, iou_threshold: float = 0.5):
+    """按类别匹配两帧的 (xyxy, 类别) 数组，返回 (参考框中被找到的数量, 候选框中命中的数量, 命中的框的IoU列表)。"""
+    ref_xyxy, ref_cls = reference
+    cand_xyxy, cand_cls = candidate
+    iou = box_iou(ref_xyxy, cand_xyxy)
+    iou[ref_cls[:, None] != cand_cls[None, :]] = 0
+    if iou.size == 0:
+        return 0, 0, []
+    best_for_ref = iou.max(axis=1)
+    best_for_cand = iou.max(axis=0)
+    hits = best_for_ref[best_for_ref >= iou_threshold]
+    return len(hits), int((best_for_cand >= iou_threshold).sum()), hits.tolist()
+
+
+def evaluate_strides(model: YOLO, video_path: Path, strides, motion_threshold: float = None,
+                     max_frames: int = 300) -> list:
+    """
+    精度-速度权衡报告：以 stride=1（每帧检测）的追踪结果为参考，
+    统计每个 stride 的召回率、精确率、命中框的平均IoU、实际检测的帧比例和追踪FPS（不含解码和写视频）。
+    每个 stride 重新打开视频逐帧解码，只保留每帧的框，内存占用与 max_frames 和分辨率基本无关。
+    """
+    with VideoSource(video_path) as source:
+        fps = source.fps
+        ok, first_frame = source.read()
+    if not ok:
+        return []
+
+    # 预热一次，避免第一次推理的初始化时间计入 stride=1
+    model.predict(first_frame, verbose=False)
+    del first_frame
+
+    reference = None
+    report = []
+    for stride in sorted(set([1, *strides])):
+        tracker = AdaptiveTracker(model, fps, stride=stride,
+                                  motion_threshold=motion_threshold if stride > 1 else None,
+                                  uncertainty_threshold=None)
+        outputs = []
+        seconds = 0.0
+        with VideoSource(video_path) as source:
+            for _, frame in zip(range(max_frames), source):
+                start = time.perf_counter()
+                results = tracker.track_frame(frame)
+                seconds += time.perf_counter() - start
+                outputs.append(_box_arrays(results))
+        if reference is None:
+            reference = outputs
+
+        ref_total = sum(len(xyxy) for xyxy, _ in reference)
+        cand_total = sum(len(xyxy) for xyxy, _ in outputs)
+        found = correct = 0
+        ious = []
+        for ref, out in zip(reference, outputs):
+            f, c, hit_ious = _match_stats(ref, out)
+            found += f
+            correct += c
+            ious.extend(hit_ious)
+        report.append({
+            "stride": stride,
+            "fps": len(outputs) / seconds if seconds > 0 else 0.0,
+            "detect_ratio": tracker.detect_ratio,
+            "recall": found / ref_total if ref_total else 1.0,
+            "precision": correct / cand_total if cand_total else 1.0,
+            "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        })
+    return report
+
+
+def print_stride_report(report: list, target_fps: float = None):
+    print(f"\n{'stride':>6} {'FPS':>7} {'检测比例':>8} {'召回率':>7} {'精确率':>7} {'平均IoU':>8}")
+    for row in report:
+        mark = " ✅" if target_fps is not None and row["fps"] >= target_fps else ""
+        print(f"{row['stride']:>6} {row['fps']:>7.1f} {row['detect_ratio']:>8.2f} {row['recall']:>7.3f} "
+              f"{row['precision']:>7.3f} {row['mean_iou']:>8.3f}{mark}")
+
+
+def main():
+    """
+    主函数，在一段视频上比较不同检测间隔（stride）下的追踪速度和精度，帮助选择能在CPU上实时运行的 stride。
+    """
+    # 要比较的检测间隔
+    STRIDES = [1, 2, 3, 5, 8]
+    # 画面变化超过这个值时提前检测（设为 None 只按固定间隔检测）
+    MOTION_THRESHOLD = 12.0
+    # 只用视频的前 N 帧做比较（每个 stride 都重新解码这 N 帧，帧不留在内存里）
+    MAX_FRAMES = 300
+
+    print("--- 开始评估跳帧追踪的精度与速度 ---")
+    project_root = Path(__file__).parent.parent
+    model_path = project_root / "runs/detect/yolov8m_bdd100k_FIXED_v15/weights/best.pt" # 请确保这是您正确的模型路径！
+    input_video_path = project_root / "data/raw/tokyo_drive_clip.mov"
+    report_path = project_root / "results/adaptive_stride_report.json"
+
+    if not model_path.exists():
+        print(f"❌ 错误：找不到模型文件: {model_path}")
+        return
+    if not input_video_path.exists():
+        print(f"❌ 错误：找不到输入视频文件: {input_video_path}")
+        return
+
+    model = YOLO(model_path)
+    with VideoSource(input_video_path) as source:
+        video_fps = source.fps
+    report = evaluate_strides(model, input_video_path, STRIDES, MOTION_THRESHOLD, MAX_FRAMES)
+    print_stride_report(report, target_fps=video_fps)
+    print(f"\n（以 stride=1 的追踪结果为参考；✅ 表示达到视频原始帧率 {video_fps:.0f} FPS）")
+
+    report_path.parent.mkdir(exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ 评估完成！报告已保存到: {report_path}")
+
+if __name__ == '__main__':
+    main()
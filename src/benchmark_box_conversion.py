@@ -0,0 +1,99 @@
+import time
+import numpy as np
+from yolo_box_ops import format_yolo_batch, format_yolo_lines, xyxy_to_yolo, xyxy_to_yolo_batch
+
+
+def convert_per_box(class_ids, boxes, img_width, img_height) -> str:
+    """原来的逐框转换方式（Python浮点运算 + 每个框一次 f-string），作为对比基线。"""
+    yolo_annotations = []
+    for class_id, (x1, y1, x2, y2) in zip(class_ids, boxes):
+        x_center = (x1 + x2) / 2.0
+        y_center = (y1 + y2) / 2.0
+        width = x2 - x1
+        height = y2 - y1
+
+        x_center_norm = x_center / img_width
+        y_center_norm = y_center / img_height
+        width_norm = width / img_width
+        height_norm = height / img_height
+
+        yolo_annotations.append(f"{class_id} {x_center_norm:.6f} {y_center_norm:.6f} {width_norm:.6f} {height_norm:.6f}")
+    return "\n".join(yolo_annotations)
+
+
+def make_synthetic_labels(num_images: int, boxes_per_image: int, img_width: int, img_height: int, seed: int = 0):
+    """生成落在图片范围内的随机框，保证两种实现的输出可以逐字比较。"""
+    rng = np.random.default_rng(seed)
+    n = num_images * boxes_per_image
+    x1 = rng.uniform(0, img_width - 50, n)
+    y1 = rng.uniform(0, img_height - 50, n)
+    boxes = np.stack([x1, y1, x1 + rng.uniform(1, 50, n), y1 + rng.uniform(1, 50, n)], axis=1)
+    class_ids = rng.integers(0, 10, n)
+    image_index = np.repeat(np.arange(num_images), boxes_per_image)
+    return image_index, class_ids, boxes
+
+
+def main():
+    """
+    主函数，比较逐框循环和向量化转换在同一批标注上的耗时，并检查两者输出一致。
+    """
+    NUM_IMAGES = 2000
+    BOXES_PER_IMAGE = 20  # BDD100K 平均每张图约 20 个框
+    IMG_WIDTH, IMG_HEIGHT = 1280, 720
+    REPEATS = 3
+    # 转换脚本每批一起转换的文件数（json2yolo_final_v3.py 的 CHUNK_SIZE）
+    CHUNK_FILES = 64
+
+    print("--- 开始对比 逐框循环 与 向量化 的标注转换速度 ---")
+    image_index, class_ids, boxes = make_synthetic_labels(NUM_IMAGES, BOXES_PER_IMAGE, IMG_WIDTH, IMG_HEIGHT)
+    per_image = [
+        (class_ids[i * BOXES_PER_IMAGE:(i + 1) * BOXES_PER_IMAGE].tolist(),
+         boxes[i * BOXES_PER_IMAGE:(i + 1) * BOXES_PER_IMAGE].tolist())
+        for i in range(NUM_IMAGES)
+    ]
+
+    def run_loop():
+        return [convert_per_box(c, b, IMG_WIDTH, IMG_HEIGHT) for c, b in per_image]
+
+    def run_vectorized_per_file():
+        outputs = []
+        for c, b in per_image:
+            ids, xywhn, _ = xyxy_to_yolo(c, b, IMG_WIDTH, IMG_HEIGHT)
+            outputs.append(format_yolo_lines(ids, xywhn))
+        return outputs
+
+    def run_vectorized_chunks():
+        outputs = []
+        for i in range(0, NUM_IMAGES, CHUNK_FILES):
+            chunk = per_image[i:i + CHUNK_FILES]
+            texts, _ = xyxy_to_yolo_batch(chunk, [(IMG_WIDTH, IMG_HEIGHT)] * len(chunk))
+            outputs.extend(texts)
+        return outputs
+
+    def run_vectorized_batch():
+        ids, xywhn, keep = xyxy_to_yolo(class_ids, boxes, IMG_WIDTH, IMG_HEIGHT)
+        return format_yolo_batch(image_index[keep], ids, xywhn, NUM_IMAGES)
+
+    reference = run_loop()
+    methods = [("向量化(逐文件)", run_vectorized_per_file), (f"向量化(每{CHUNK_FILES}个文件一批)", run_vectorized_chunks),
+               ("向量化(全部一批)", run_vectorized_batch)]
+    for name, fn in methods:
+        if fn() != reference:
+            print(f"❌ 错误：{name} 的输出与逐框循环不一致！")
+            return
+
+    print(f"共 {NUM_IMAGES} 张图片，{len(boxes)} 个框，每种方法重复 {REPEATS} 次取最快值：")
+    baseline = None
+    for name, fn in [("逐框循环", run_loop), *methods]:
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        print(f"  - {name}: {best * 1000:.1f} ms  ({len(boxes) / best:,.0f} 框/秒, {baseline / best:.2f}x)")
+
+    print("\n✅ 输出一致性检查通过，对比完成！")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import json
+import os
+import platform
+import time
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+import ultralytics
+from ultralytics import YOLO
+from label_manifest import file_sha1
+
+# 报告中的延迟分位数
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def load_frames(image_dir: Path, count: int, size: tuple = (1280, 720), seed: int = 0):
+    """
+    读取 image_dir 中的前 count 张图片（提前解码，解码时间不计入推理延迟）。
+    目录不存在或没有图片时，用固定随机种子生成 size 大小的合成帧。返回 (帧列表, 来源)。
+    """
+    image_dir = Path(image_dir)
+    paths = []
+    if image_dir.is_dir():
+        paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))[:count]
+    frames = [frame for frame in (cv2.imread(str(p)) for p in paths) if frame is not None]
+    if frames:
+        return frames, str(image_dir)
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8) for _ in range(count)], "synthetic"
+
+
+def _batches(frames: list, batch_size: int):
+    """循环地从 frames 中依次取 batch_size 张组成一个batch。"""
+    i = 0
+    while True:
+        yield [frames[(i + k) % len(frames)] for k in range(batch_size)]
+        i += batch_size
+
+
+def benchmark_config(weights_path: Path, frames: list, imgsz: int, batch_size: int, threads: int,
+                     iterations: int = 20, warmup: int = 3, device='cpu') -> dict:
+    """
+    测试一种 (imgsz, batch, 线程数) 配置下 model.predict 的端到端耗时（预处理 + 推理 + NMS）。
+    每种配置重新加载模型，warmup_seconds 为加载后第一次调用的耗时（包含 predictor 初始化和首次运行的开销）。
+    """
+    torch.set_num_threads(threads)
+    start = time.perf_counter()
+    model = YOLO(weights_path)
+    load_seconds = time.perf_counter() - start
+
+    kwargs = {"imgsz": imgsz, "device": device, "verbose": False}
+    batches = _batches(frames, batch_size)
+    start = time.perf_counter()
+    model.predict(next(batches), **kwargs)
+    warmup_seconds = time.perf_counter() - start
+    for _ in range(warmup):
+        model.predict(next(batches), **kwargs)
+
+    latencies = np.zeros(iterations)
+    stages = {"preprocess": [], "inference": [], "postprocess": []}
+    for i in range(iterations):
+        batch = next(batches)
+        start = time.perf_counter()
+        results = model.predict(batch, **kwargs)
+        latencies[i] = time.perf_counter() - start
+        for stage, values in stages.items():
+            values.append(results[0].speed[stage])
+
+    latencies_ms = latencies * 1000
+    return {
+        "imgsz": imgsz,
+        "batch_size": batch_size,
+        "threads": threads,
+        "iterations": iterations,
+        "load_seconds": round(load_seconds, 4),
+        "warmup_seconds": round(warmup_seconds, 4),
+        # 每次 predict 调用（一个batch）的延迟
+        "latency_ms": {"mean": float(latencies_ms.mean()),
+                       **{f"p{q}": float(np.percentile(latencies_ms, q)) for q in LATENCY_PERCENTILES}},
+        "throughput_fps": batch_size * iterations / float(latencies.sum()),
+        # Ultralytics 统计的每张图片各阶段耗时（中位数）
+        "stage_ms_per_image": {stage: float(np.median(values)) for stage, values in stages.items()},
+    }
+
+
+def benchmark_model(weights_path: Path, frames: list, imgsizes, batch_sizes, thread_counts,
+                    iterations: int = 20, warmup: int = 3, device='cpu') -> dict:
+    """对一个权重文件测试所有 (imgsz, batch, 线程数) 组合，返回带环境信息的报告。"""
+    weights_path = Path(weights_path)
+    torch_threads = torch.get_num_threads()
+    results = []
+    try:
+        for imgsz, batch_size, threads in product(imgsizes, batch_sizes, thread_counts):
+            row = benchmark_config(weights_path, frames, imgsz, batch_size, threads, iterations, warmup, device)
+            print(f"   imgsz={imgsz:<5} batch={batch_size:<3} threads={threads:<3} "
+                  f"p50={row['latency_ms']['p50']:8.1f}ms  p99={row['latency_ms']['p99']:8.1f}ms  "
+                  f"{row['throughput_fps']:6.1f} FPS  预热 {row['warmup_seconds']:.2f}s")
+            results.append(row)
+    finally:
+        torch.set_num_threads(torch_threads)
+
+    return {
+        "run": weights_path.parent.parent.name,
+        "weights": str(weights_path),
+        "weights_sha1": file_sha1(weights_path),
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "device": str(device),
+        "environment": {
+            "torch": torch.__version__,
+            "ultralytics": ultralytics.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "frames": {"count": len(frames), "shape": list(frames[0].shape)},
+        "results": results,
+    }
+
+
+def compare_reports(previous: dict, current: dict) -> list:
+    """按 (imgsz, batch, 线程数) 对齐两次报告，返回 p50 延迟和吞吐的相对变化。"""
+    def key(row):
+        return row["imgsz"], row["batch_size"], row["threads"]
+
+    old_rows = {key(row): row for row in previous.get("results", [])}
+    changes = []
+    for row in current["results"]:
+        old = old_rows.get(key(row))
+        if old is None:
+            continue
+        changes.append({
+            "imgsz": row["imgsz"], "batch_size": row["batch_size"], "threads": row["threads"],
+            "p50_change": row["latency_ms"]["p50"] / old["latency_ms"]["p50"] - 1,
+            "throughput_change": row["throughput_fps"] / old["throughput_fps"] - 1,
+        })
+    return changes
+
+
+def main():
+    """
+    主函数，在CPU上测试 runs/detect/ 下每个模型的预热时间、延迟分位数和吞吐，
+    每个模型的结果写入 results/benchmarks/inference_<训练名>.json，并与上一次的结果对比。
+    """
+    MODEL_GLOB = "runs/detect/*/weights/best.pt"
+    IMGSIZES = [320, 640]
+    BATCH_SIZES = [1, 4, 8]
+    THREAD_COUNTS = sorted({1, 4, os.cpu_count() or 1})
+    NUM_FRAMES = 32
+    ITERATIONS = 20
+    WARMUP = 3
+    # 变化超过这个比例时提示可能的性能回退
+    REGRESSION_THRESHOLD = 0.10
+
+    print("--- 开始测试模型推理延迟与吞吐 (CPU) ---")
+    project_root = Path(__file__).parent.parent
+    output_dir = project_root / "results/benchmarks"
+    weights_paths = sorted(project_root.glob(MODEL_GLOB))
+    if not weights_paths:
+        print(f"❌ 错误：找不到任何模型权重: {project_root / MODEL_GLOB}")
+        return
+
+    frames, frames_source = load_frames(project_root / "data/processed/images/val", NUM_FRAMES)
+    print(f"测试帧: {len(frames)} 张，来源: {frames_source}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for weights_path in weights_paths:
+        print(f"\n--- 模型: {weights_path.relative_to(project_root)} ---")
+        report = benchmark_model(weights_path, frames, IMGSIZES, BATCH_SIZES, THREAD_COUNTS,
+                                 iterations=ITERATIONS, warmup=WARMUP, device='cpu')
+        report["frames"]["source"] = frames_source
+
+        report_path = output_dir / f"inference_{report['run']}.json"
+        if report_path.exists():
+            with open(report_path) as f:
+                previous = json.load(f)
+            for change in compare_reports(previous, report):
+                if change["throughput_change"] < -REGRESSION_THRESHOLD:
+                    print(f"   ⚠️ 吞吐下降 {-change['throughput_change']:.0%}: imgsz={change['imgsz']} "
+                          f"batch={change['batch_size']} threads={change['threads']} "
+                          f"(上次 {previous['created']})")
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ 结果已保存到: {report_path}")
+
+    print("\n✅ 所有模型测试完成！")
+
+if __name__ == '__main__':
+    main()
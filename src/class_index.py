@@ -0,0 +1,140 @@
+import hashlib
+import math
+import os
+from pathlib import Path
+import numpy as np
+from packed_labels import BOXES_FILENAME, NAMES_FILENAME, OFFSETS_FILENAME, PackedLabelStore, parse_yolo_txt
+
+
+def label_path_for(base_path: Path, image_rel_path: str) -> Path:
+    """由列表中的图片路径（./images/<split>/x.jpg）得到对应的标签路径（labels/<split>/x.txt），与Ultralytics的规则一致。"""
+    split, filename = Path(image_rel_path).parts[-2:]
+    return base_path / "labels" / split / f"{Path(filename).stem}.txt"
+
+
+def _hash_stat(h, path):
+    try:
+        stat = os.stat(path)
+        h.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+    except FileNotFoundError:
+        h.update(f"{path}:missing\n".encode())
+
+
+def label_fingerprint(label_paths) -> str:
+    """
+    所有标签文件的 (路径, mtime, 大小) 的哈希，任何标签变化都会让缓存失效。
+    标签目录旁边的打包标签 labels/<split>.packed 也计入指纹：读取时优先使用打包标签，
+    而只写打包标签（WRITE_TXT=False）时 .txt 根本不会变化。
+    """
+    h = hashlib.sha1()
+    label_dirs = set()
+    for path in label_paths:
+        label_dirs.add(Path(path).parent)
+        _hash_stat(h, path)
+    for label_dir in sorted(label_dirs):
+        packed_dir = label_dir.with_name(f"{label_dir.name}.packed")
+        for filename in (BOXES_FILENAME, OFFSETS_FILENAME, NAMES_FILENAME):
+            _hash_stat(h, packed_dir / filename)
+    return h.hexdigest()
+
+
+def build_class_index(base_path: Path, image_paths: dict, num_classes: int, cache_path: Path = None):
+    """
+    一次遍历所有YOLO标签，建立每张图片的类别计数矩阵。
+    image_paths 为 {图片文件名: ./images/<split>/x.jpg}，返回 (图片文件名列表, counts)，
+    counts 形状为 (图片数, 类别数)，counts[i, c] 是第 i 张图片中类别 c 的框数。
+    对应的 labels/<split>.packed 存在时直接从打包标签读取；结果按标签指纹缓存在 cache_path。
+    """
+    names = sorted(image_paths)
+    label_paths = [label_path_for(base_path, image_paths[n]) for n in names]
+    fingerprint = label_fingerprint(label_paths)
+
+    if cache_path is not None and Path(cache_path).exists():
+        cached = np.load(cache_path, allow_pickle=False)
+        if str(cached["fingerprint"]) == fingerprint and cached["counts"].shape == (len(names), num_classes):
+            print(f"使用缓存的类别索引: {cache_path}")
+            return names, cached["counts"]
+
+    packed_stores = {}
+    counts = np.zeros((len(names), num_classes), dtype=np.int32)
+    for i, label_path in enumerate(label_paths):
+        split = label_path.parent.name
+        if split not in packed_stores:
+            packed_dir = label_path.parent.with_name(f"{split}.packed")
+            packed_stores[split] = PackedLabelStore(packed_dir) if packed_dir.exists() else None
+        store = packed_stores[split]
+
+        if store is not None and label_path.stem in store:
+            rows = store[label_path.stem]
+        elif label_path.exists():
+            rows = parse_yolo_txt(label_path)
+        else:
+            continue
+        counts[i] = np.bincount(rows[:, 0].astype(np.int64), minlength=num_classes)[:num_classes]
+
+    if cache_path is not None:
+        np.savez(cache_path, counts=counts, fingerprint=np.array(fingerprint))
+    return names, counts
+
+
+def stratified_split(names, counts: np.ndarray, val_ratio: float, fraction_key):
+    """
+    按类别分层的确定性划分。
+    每张图片按其包含的“最稀有”类别（出现该类别的图片最少）分组，没有任何框的图片单独一组；
+    每组内部按 fraction_key(图片名)（例如 [0, 1) 的文件名哈希）排序，前 round(组大小 × val_ratio) 张进入验证集，
+    这样即使是只有几张图片的稀有类别，验证集也能分到它应有的份额。
+    代价是稳定性比 assign_split 弱：图片的归属取决于它在组内的排名，增加新图片后，
+    哈希值靠近各组分界的少数图片可能在训练集和验证集之间移动（离分界远的图片不受影响）。
+    返回排好序的 (train_names, val_names)。
+    """
+    present = counts > 0
+    images_per_class = present.sum(axis=0)
+    # 不出现的类别设为无穷大，argmin 时不会被选中
+    rarity = np.where(present, images_per_class[None, :], np.iinfo(np.int64).max)
+    groups = np.where(present.any(axis=1), rarity.argmin(axis=1), -1)
+
+    train_names, val_names = [], []
+    for group in np.unique(groups):
+        members = sorted((names[i] for i in np.flatnonzero(groups == group)), key=lambda n: (fraction_key(n), n))
+        num_val = int(round(len(members) * val_ratio))
+        val_names.extend(members[:num_val])
+        train_names.extend(members[num_val:])
+        label = "无框" if group < 0 else f"类别 {group}"
+        print(f"   分层 {label}: {len(members)} 张，验证集 {num_val} 张 ({num_val / len(members):.1%})")
+    return sorted(train_names), sorted(val_names)
+
+
+def repeat_factors(counts: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    LVIS 的重复因子采样 (Repeat Factor Sampling)：
+    类别 c 的因子 r_c = max(1, sqrt(t / f_c))，f_c 为包含类别 c 的图片比例；
+    图片的因子取它所含类别因子的最大值，没有框的图片为 1。
+    """
+    present = counts > 0
+    freq = present.mean(axis=0)
+    with np.errstate(divide='ignore'):
+        class_factors = np.maximum(1.0, np.sqrt(threshold / freq))
+    class_factors[freq == 0] = 1.0
+    return np.where(present, class_factors[None, :], 1.0).max(axis=1)
+
+
+def repeat_factor_list(names, factors: np.ndarray, seed: int):
+    """按重复因子展开训练列表：整数部分固定重复，小数部分按概率随机取整（固定种子，可复现）。"""
+    rng = np.random.default_rng(seed)
+    repeats = np.floor(factors).astype(np.int64)
+    repeats += rng.random(len(factors)) < (factors - repeats)
+    expanded = []
+    for name, r in zip(names, repeats):
+        expanded.extend([name] * int(r))
+    return expanded
+
+
+def summarize_repeats(counts: np.ndarray, factors: np.ndarray, class_names: dict):
+    """打印每个类别在采样前后的图片出现次数，便于确认稀有类别确实被过采样。"""
+    present = counts > 0
+    before = present.sum(axis=0)
+    after = (present * factors[:, None]).sum(axis=0)
+    print("各类别图片出现次数（采样前 -> 采样后期望值）：")
+    for c, name in class_names.items():
+        ratio = after[c] / before[c] if before[c] else math.nan
+        print(f"  - {name}: {before[c]} -> {after[c]:.0f} (x{ratio:.2f})")
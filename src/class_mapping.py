@@ -0,0 +1,118 @@
+from pathlib import Path
+import numpy as np
+import yaml
+from yolo_box_ops import nms
+
+
+def _names_to_ids(names) -> dict:
+    """数据集配置里的 names（字典或列表）→ {类别名: ID}。"""
+    if isinstance(names, dict):
+        return {str(v): int(k) for k, v in names.items()}
+    return {str(v): i for i, v in enumerate(names)}
+
+
+def _lookup_table(mapping: dict) -> np.ndarray:
+    """{源类别ID: 目标类别ID} → 查找表，没有映射的ID对应 -1（丢弃）。"""
+    table = np.full(max(mapping, default=-1) + 1, -1, dtype=np.int64)
+    for src, dst in mapping.items():
+        table[src] = dst
+    return table
+
+
+def remap_classes(class_ids: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """按查找表批量换算类别ID，超出查找表范围的ID也返回 -1。"""
+    class_ids = np.asarray(class_ids, dtype=np.int64)
+    result = np.full(class_ids.shape, -1, dtype=np.int64)
+    inside = (class_ids >= 0) & (class_ids < len(table))
+    result[inside] = table[class_ids[inside]]
+    return result
+
+
+class ClassMapping:
+    """
+    一种评估用的类别映射：把模型的预测和数据集的真值都换算到同一个类别空间（见 config/class_mappings.yaml）。
+    作用在缓存的预测上，不需要重新推理。
+    """
+
+    def __init__(self, name: str, names: list, model_yaml: Path, dataset_yaml: Path,
+                 prediction_map: dict, label_map: dict, merge_iou: float = None):
+        self.name = name
+        self.names = {i: n for i, n in enumerate(names)}
+        self.model_yaml = Path(model_yaml)
+        self.dataset_yaml = Path(dataset_yaml)
+        self.prediction_table = _lookup_table(prediction_map)
+        self.label_table = _lookup_table(label_map)
+        self.merge_iou = merge_iou
+
+    @property
+    def class_ids(self) -> list:
+        return list(self.names)
+
+    def apply_to_predictions(self, predictions: dict) -> dict:
+        """换算 {图片: (尺寸, (n, 6) 检测)} 中的类别；没有映射的检测被丢弃，合并后的类别可选再做一次NMS。"""
+        mapped = {}
+        for image_path, (shape, det) in predictions.items():
+            cls = remap_classes(det[:, 5], self.prediction_table)
+            keep = cls >= 0
+            det = det[keep].copy()
+            det[:, 5] = cls[keep]
+            if self.merge_iou is not None and len(det) > 1:
+                # nms 返回按置信度降序的下标，保持 YOLO 输出“按置信度排序”的约定
+                det = det[nms(det[:, :4], det[:, 4], det[:, 5], self.merge_iou)]
+            mapped[image_path] = (shape, det)
+        return mapped
+
+    def apply_to_ground_truth(self, ground_truth: dict) -> dict:
+        """换算 {图片: (类别数组, xyxy数组)} 中的真值类别；没有映射的真值被丢弃。"""
+        mapped = {}
+        for image_path, (cls, xyxy) in ground_truth.items():
+            new_cls = remap_classes(cls, self.label_table)
+            keep = new_cls >= 0
+            mapped[image_path] = (new_cls[keep], xyxy[keep])
+        return mapped
+
+    def describe(self) -> str:
+        return f"{self.name}: {self.model_yaml.stem} → {self.dataset_yaml.stem}，类别 {list(self.names.values())}"
+
+
+def load_class_mappings(mapping_path: Path, config_dir: Path = None) -> dict:
+    """
+    读取类别映射配置，按类别名解析成ID，返回 {映射名: ClassMapping}。
+    model / dataset 是相对于 config_dir（默认为映射文件所在目录）的数据集配置文件。
+    """
+    mapping_path = Path(mapping_path)
+    config_dir = Path(config_dir) if config_dir is not None else mapping_path.parent
+    with open(mapping_path) as f:
+        entries = yaml.safe_load(f) or {}
+
+    class_names = {}
+
+    def names_of(yaml_name):
+        if yaml_name not in class_names:
+            with open(config_dir / yaml_name) as f:
+                class_names[yaml_name] = _names_to_ids(yaml.safe_load(f)['names'])
+        return class_names[yaml_name]
+
+    mappings = {}
+    for name, entry in entries.items():
+        model_ids, dataset_ids = names_of(entry['model']), names_of(entry['dataset'])
+        target_ids = {n: i for i, n in enumerate(entry['names'])}
+        labels = entry.get('labels') or {n: n for n in dataset_ids if n in target_ids}
+
+        def resolve(pairs, source_ids, kind):
+            resolved = {}
+            for src, dst in pairs.items():
+                if src not in source_ids:
+                    raise ValueError(f"类别映射 {name}：{kind}里没有类别 '{src}'")
+                if dst not in target_ids:
+                    raise ValueError(f"类别映射 {name}：'{dst}' 不在 names 中")
+                resolved[source_ids[src]] = target_ids[dst]
+            return resolved
+
+        mappings[name] = ClassMapping(
+            name, entry['names'], config_dir / entry['model'], config_dir / entry['dataset'],
+            resolve(entry['predictions'], model_ids, entry['model']),
+            resolve(labels, dataset_ids, entry['dataset']),
+            entry.get('merge_iou'),
+        )
+    return mappings
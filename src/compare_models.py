@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+from ultralytics.utils import ops
+from detection_metrics import load_ground_truth, per_image_errors
+
+# CPU 上每个并行运行的模型至少要分到的线程数；核数不够时模型改为依次运行
+MIN_THREADS_PER_MODEL = 2
+
+
+def load_batch(image_paths: list, imgsz: int = 640):
+    """
+    每张图片只解码一次，letterbox 到 imgsz × imgsz 后拼成一个所有模型共用的 (B, 3, imgsz, imgsz) RGB 张量（0~1）。
+    返回 (张量, 原图 (高, 宽) 列表)。
+    """
+    letterbox = LetterBox(new_shape=(imgsz, imgsz), auto=False)
+    images, shapes = [], []
+    for image_path in image_paths:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            raise ValueError(f"无法读取图片: {image_path}")
+        shapes.append(image.shape[:2])
+        images.append(letterbox(image=image))
+    batch = np.ascontiguousarray(np.stack(images)[..., ::-1].transpose(0, 3, 1, 2))
+    return torch.from_numpy(batch).float().div_(255), shapes
+
+
+class ComparedModel:
+    """参与对比的一个模型：推理置信度、可选的类别映射（见 class_mapping.py）、累计的预测和推理耗时。"""
+
+    def __init__(self, name: str, weights: Path, conf: float = 0.25, mapping=None):
+        self.name = name
+        self.weights = Path(weights)
+        self.model = YOLO(self.weights)
+        self.conf = conf
+        self.mapping = mapping
+        self.predictions = {}
+        self.seconds = 0.0
+
+    def run(self, tensor: torch.Tensor, image_paths: list, shapes: list, device=None):
+        """在共享张量上推理，把框换算回原图坐标后记录到 predictions。"""
+        start = time.perf_counter()
+        kwargs = {"conf": self.conf, "verbose": False}
+        if device is not None:
+            kwargs["device"] = device
+        for image_path, shape, results in zip(image_paths, shapes, self.model.predict(tensor, **kwargs)):
+            det = results.boxes.data.cpu().numpy().astype(np.float32)
+            det[:, :4] = ops.scale_boxes(tensor.shape[2:], det[:, :4], shape)
+            self.predictions[str(image_path)] = (tuple(shape), det)
+        self.seconds += time.perf_counter() - start
+
+    def mapped_predictions(self) -> dict:
+        return self.mapping.apply_to_predictions(self.predictions) if self.mapping else self.predictions
+
+
+def parallel_workers(n_models: int, device=None) -> int:
+    """同时运行的模型数：GPU 上全部并行；CPU 上受核数限制，保证每个模型至少 MIN_THREADS_PER_MODEL 个线程。"""
+    if device is not None and str(device) != 'cpu':
+        return max(n_models, 1)
+    return max(1, min(n_models, (os.cpu_count() or 1) // MIN_THREADS_PER_MODEL))
+
+
+def compare_models(models: list, image_paths: list, class_ids, imgsz: int = 640, batch_size: int = 16,
+                   iou_threshold: float = 0.5, device=None, num_workers: int = None) -> dict:
+    """
+    在同一批图片上对比多个 ComparedModel：
+    每个batch只解码一次（后台线程预取下一个batch），共享张量同时交给各个模型（每个模型一个线程），
+    最后按真值逐图片统计每个模型的漏检和误检。
+    """
+    image_paths = [str(p) for p in image_paths]
+    workers = num_workers or parallel_workers(len(models), device)
+    torch_threads = torch.get_num_threads()
+    if device is None or str(device) == 'cpu':
+        # 多个模型同时推理时平分CPU核，避免线程数超额
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+    batches = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+    decode_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(1) as decode_pool, ThreadPoolExecutor(workers) as model_pool:
+            pending = decode_pool.submit(load_batch, batches[0], imgsz) if batches else None
+            for i, batch_paths in enumerate(batches):
+                wait_start = time.perf_counter()
+                tensor, shapes = pending.result()
+                decode_seconds += time.perf_counter() - wait_start
+                if i + 1 < len(batches):
+                    pending = decode_pool.submit(load_batch, batches[i + 1], imgsz)
+                if device is not None and str(device) != 'cpu':
+                    tensor = tensor.to(device)
+                # 同一个模型同一时间只在一个线程里运行（Ultralytics 的 predictor 不是线程安全的）
+                futures = [model_pool.submit(m.run, tensor, batch_paths, shapes, device) for m in models]
+                for future in futures:
+                    future.result()
+    finally:
+        torch.set_num_threads(torch_threads)
+    wall_seconds = time.perf_counter() - start
+
+    ground_truth = load_ground_truth(models[0].predictions) if models else {}
+    errors = {m.name: per_image_errors(m.mapped_predictions(), ground_truth, class_ids, conf=m.conf,
+                                       iou_threshold=iou_threshold) for m in models}
+
+    summary = {}
+    for m in models:
+        rows = errors[m.name].values()
+        tp, missed, extra = (sum(r[key] for r in rows) for key in ("tp", "missed", "extra"))
+        summary[m.name] = {
+            "weights": str(m.weights), "conf": m.conf, "mapping": m.mapping.name if m.mapping else None,
+            "inference_seconds": round(m.seconds, 3),
+            "tp": tp, "missed": missed, "extra": extra,
+            "precision": tp / max(tp + extra, 1), "recall": tp / max(tp + missed, 1),
+            "images_with_errors": sum(1 for r in rows if r["missed"] or r["extra"]),
+        }
+
+    per_image = []
+    for image_path in image_paths:
+        row = {"image": image_path, "gt": len(ground_truth[image_path][0]) if ground_truth else 0}
+        for m in models:
+            e = errors[m.name][image_path]
+            row[m.name] = {"detections": e["detections"], "missed": e["missed"], "extra": e["extra"]}
+        per_image.append(row)
+
+    return {
+        "images": len(image_paths), "imgsz": imgsz, "batch_size": batch_size, "iou_threshold": iou_threshold,
+        "workers": workers, "decode_wait_seconds": round(decode_seconds, 3), "wall_seconds": round(wall_seconds, 3),
+        "models": summary, "per_image": per_image,
+    }
+
+
+def disagreements(report: dict) -> list:
+    """各模型漏检数或误检数不一致的图片，按差异从大到小排列。"""
+    names = list(report["models"])
+    rows = []
+    for row in report["per_image"]:
+        missed = [row[n]["missed"] for n in names]
+        extra = [row[n]["extra"] for n in names]
+        spread = (max(missed) - min(missed)) + (max(extra) - min(extra)) if names else 0
+        if spread:
+            rows.append((spread, row))
+    rows.sort(key=lambda item: -item[0])
+    return [row for _, row in rows]
+
+
+def write_diff_report(report: dict, output_dir: Path) -> tuple:
+    """写出完整报告 (JSON) 和逐图片的漏检/误检表 (CSV)，返回两个文件路径。"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    json_path = output_dir / "comparison_report.json"
+    csv_path = output_dir / "per_image_diff.csv"
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    names = list(report["models"])
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "gt"] + [f"{n}_{key}" for n in names for key in ("detections", "missed", "extra")])
+        for row in report["per_image"]:
+            writer.writerow([row["image"], row["gt"]] +
+                            [row[n][key] for n in names for key in ("detections", "missed", "extra")])
+    return json_path, csv_path
+
+
+def print_comparison(report: dict, top: int = 10):
+    print(f"\n共 {report['images']} 张图片，{report['workers']} 个模型并行，"
+          f"总耗时 {report['wall_seconds']:.2f} 秒（等待解码 {report['decode_wait_seconds']:.2f} 秒）")
+    print(f"{'模型':<16} {'conf':>5} {'TP':>6} {'漏检':>6} {'误检':>6} {'P':>7} {'R':>7} {'推理(秒)':>9}")
+    for name, s in report["models"].items():
+        print(f"{name:<16} {s['conf']:>5.2f} {s['tp']:>6} {s['missed']:>6} {s['extra']:>6} "
+              f"{s['precision']:>7.3f} {s['recall']:>7.3f} {s['inference_seconds']:>9.2f}")
+
+    rows = disagreements(report)
+    if rows:
+        print(f"\n模型之间差异最大的 {min(top, len(rows))} 张图片（漏检/误检）：")
+        for row in rows[:top]:
+            detail = "  ".join(f"{n}: {row[n]['missed']}/{row[n]['extra']}" for n in report["models"])
+            print(f"  - {Path(row['image']).name} (真值 {row['gt']})  {detail}")
@@ -1,72 +1,63 @@
 import numpy
-from ultralytics import YOLO
 from pathlib import Path
 import torch
+from class_mapping import load_class_mappings
+from compare_models import ComparedModel, compare_models, print_comparison, write_diff_report
 
 def main():
     """
     主函数，用于【同台竞技】
     比较“行人专才”模型和“交通通才”模型
     在Penn-Fudan验证集上的真实表现。
+    每张图片只解码一次，两个模型在共享的输入上并行推理，输出逐图片的漏检/误检对比报告。
     """
+    # 参与对比的模型：名称、权重（相对项目根目录）、置信度，以及把模型类别换算到行人类别的映射（可选）
+    MODELS = [
+        {"name": "penn_v4", "weights": "runs/detect/yolov8m_final_tuning_v4/weights/best.pt", "conf": 0.25},
+        # 我们仍然使用一个较低的置信度，给“通才”一个机会
+        {"name": "bdd_v13", "weights": "runs/detect/yolov8m_bdd100k_multiclass_v13/weights/best.pt", "conf": 0.1,
+         "mapping": "bdd100k_to_pennfudan"},
+    ]
+    IMGSZ = 640
+    BATCH_SIZE = 16
+    IOU_THRESHOLD = 0.5
+
     print("--- 开始执行模型“同台竞技”对比 ---")
     device = 0 if torch.cuda.is_available() else 'cpu'
 
     # --- 1. 定义路径 ---
     project_root = Path(__file__).parent.parent
-    
-    # 定义“专才”模型 (Penn-Fudan V4)
-    penn_model_path = project_root / "runs/detect/yolov8m_final_tuning_v4/weights/best.pt"
-    # 定义“通才”模型 (BDD100K V13)
-    bdd_model_path = project_root / "runs/detect/yolov8m_bdd100k_multiclass_v13/weights/best.pt"
-    
+
     # 定义我们要测试的图片来源：Penn-Fudan的验证集图片
     penn_val_images_dir = project_root / "data/processed/images/val"
-    
-    # 【【【重要】】】我们为两个模型创建各自的结果文件夹
-    output_dir_penn = project_root / "results/COMPARE_penn_model_on_penn/"
-    output_dir_bdd = project_root / "results/COMPARE_bdd_model_on_penn/"
-    output_dir_penn.mkdir(exist_ok=True)
-    output_dir_bdd.mkdir(exist_ok=True)
+    output_dir = project_root / "results/COMPARE_models_on_penn/"
 
     # --- 2. 加载模型 ---
-    print(f"正在加载“行人专才”模型 (V4)...")
-    model_penn = YOLO(penn_model_path)
-    print(f"正在加载“交通通才”模型 (V13)...")
-    model_bdd = YOLO(bdd_model_path)
+    mappings = load_class_mappings(project_root / "config/class_mappings.yaml")
+    models = []
+    for spec in MODELS:
+        weights = project_root / spec["weights"]
+        if not weights.exists():
+            print(f"❌ 错误：找不到模型 {spec['name']}: {weights}")
+            return
+        print(f"正在加载模型 {spec['name']}...")
+        mapping = mappings[spec["mapping"]] if spec.get("mapping") else None
+        models.append(ComparedModel(spec["name"], weights, conf=spec["conf"], mapping=mapping))
     print("✅ 所有模型加载成功！")
 
-    # --- 3. “行人专才”进行预测 ---
+    # --- 3. 并行预测并逐图片对比 ---
     if not penn_val_images_dir.exists():
         print(f"❌ 错误：找不到Penn-Fudan的验证图片: {penn_val_images_dir}")
         return
-            
-    print(f"\n--- 正在使用“行人专才”模型进行预测... ---")
-    model_penn.predict(
-        source=str(penn_val_images_dir),
-        save=True,
-        conf=0.25, # 使用一个标准的置信度
-        project=str(output_dir_penn),
-        name="inference_results",
-        device=device,
-        exist_ok=True
-    )
-    print(f"✅ “行人专才”模型预测完成，结果已保存到: {output_dir_penn}")
+    image_paths = sorted(p for p in penn_val_images_dir.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
 
-    # --- 4. “交通通才”进行预测 ---
-    print(f"\n--- 正在使用“交通通才”模型进行预测... ---")
-    model_bdd.predict(
-        source=str(penn_val_images_dir),
-        save=True,
-        conf=0.1, # 我们仍然使用一个较低的置信度，给它一个机会
-        project=str(output_dir_bdd),
-        name="inference_results",
-        device=device,
-        exist_ok=True
-    )
-    print(f"✅ “交通通才”模型预测完成，结果已保存到: {output_dir_bdd}")
+    print(f"\n--- 正在对 {len(image_paths)} 张图片进行对比预测... ---")
+    report = compare_models(models, image_paths, class_ids=[0], imgsz=IMGSZ, batch_size=BATCH_SIZE,
+                            iou_threshold=IOU_THRESHOLD, device=device)
+    print_comparison(report)
+    json_path, csv_path = write_diff_report(report, output_dir)
 
-    print("\n\n✅ 所有对比预测已完成！请下载并对比 'results/' 目录下的两个新文件夹。")
+    print(f"\n\n✅ 所有对比预测已完成！逐图片差异: {csv_path}，完整报告: {json_path}")
 
 if __name__ == '__main__':
     main()
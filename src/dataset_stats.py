@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+from multiprocessing import Pool
+from pathlib import Path
+import numpy as np
+import yaml
+from class_index import label_fingerprint
+from packed_labels import PackedLabelStore, parse_yolo_txt
+
+# 每张图片框数的直方图分箱：[0], [1], [2-5], [6-10], [11-20], [21-50], [51+]
+BOXES_PER_IMAGE_BINS = [0, 1, 2, 6, 11, 21, 51]
+# COCO 的小/中/大目标面积阈值（像素）
+COCO_AREA_THRESHOLDS = (32 ** 2, 96 ** 2)
+
+
+def read_label_chunk(label_paths):
+    """读取一批标签文件，返回 (所有框拼接成的 (n, 5) 数组, 每个文件的框数)。缺失的标签按空文件处理。"""
+    chunks, counts = [], []
+    for path in label_paths:
+        rows = parse_yolo_txt(path) if os.path.exists(path) else np.empty((0, 5))
+        chunks.append(rows)
+        counts.append(len(rows))
+    boxes = np.concatenate(chunks) if chunks else np.empty((0, 5))
+    return boxes, np.array(counts, dtype=np.int64)
+
+
+def collect_labels(label_paths, num_workers: int = 1, chunk_size: int = 1024):
+    """
+    并行读取所有标签。文件按 chunk_size 分块交给进程池，每块返回一个数组，减少进程间通信的次数。
+    返回 (所有框 (n, 5), 每张图片的框数)。
+    """
+    label_paths = [str(p) for p in label_paths]
+    chunks = [label_paths[i:i + chunk_size] for i in range(0, len(label_paths), chunk_size)]
+    if num_workers > 1 and len(chunks) > 1:
+        with Pool(processes=num_workers) as pool:
+            results = pool.map(read_label_chunk, chunks)
+    else:
+        results = [read_label_chunk(chunk) for chunk in chunks]
+    if not results:
+        return np.empty((0, 5)), np.empty(0, dtype=np.int64)
+    boxes = np.concatenate([r[0] for r in results])
+    counts = np.concatenate([r[1] for r in results])
+    return boxes, counts
+
+
+def collect_packed(store: PackedLabelStore, names=None):
+    """从打包标签中取出所有框（或指定图片的框），不需要读取任何小文件。"""
+    if names is None:
+        return np.asarray(store.boxes), np.diff(store.offsets)
+    chunks = [store[n] if n in store else np.empty((0, 5)) for n in names]
+    counts = np.array([len(c) for c in chunks], dtype=np.int64)
+    boxes = np.concatenate(chunks) if chunks else np.empty((0, 5))
+    return boxes, counts
+
+
+def _quantiles(values: np.ndarray) -> dict:
+    if len(values) == 0:
+        return {}
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {"mean": float(values.mean()), "p5": float(p5), "p50": float(p50), "p95": float(p95),
+            "min": float(values.min()), "max": float(values.max())}
+
+
+def compute_stats(boxes: np.ndarray, counts: np.ndarray, class_names: dict, img_size=None) -> dict:
+    """
+    对所有框做一次向量化汇总。img_size=(宽, 高) 给出时，额外按像素计算COCO的小/中/大目标分布，
+    宽高比也按像素计算（否则按归一化坐标计算）。
+    """
+    num_classes = len(class_names)
+    class_ids = boxes[:, 0].astype(np.int64)
+    widths, heights = boxes[:, 3].copy(), boxes[:, 4].copy()
+    if img_size is not None:
+        widths *= img_size[0]
+        heights *= img_size[1]
+
+    # 每张图片包含每个类别与否：用 (图片序号, 类别) 去重计数
+    # 超出类别表的ID会串到下一张图片的键上，先去掉（单独计入 unknown_class_boxes）
+    image_index = np.repeat(np.arange(len(counts)), counts)
+    known = (class_ids >= 0) & (class_ids < num_classes)
+    pairs = np.unique(image_index[known] * num_classes + class_ids[known])
+    images_per_class = np.bincount(pairs % num_classes, minlength=num_classes)
+    box_counts = np.bincount(class_ids[known], minlength=num_classes)
+
+    bins = BOXES_PER_IMAGE_BINS + [np.iinfo(np.int64).max]
+    hist, _ = np.histogram(counts, bins=bins)
+    bin_labels = ["0", "1", "2-5", "6-10", "11-20", "21-50", "51+"]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect = widths / heights
+    aspect = aspect[np.isfinite(aspect)]
+
+    stats = {
+        "num_images": int(len(counts)),
+        "num_boxes": int(len(boxes)),
+        "num_empty_images": int((counts == 0).sum()),
+        "classes": {
+            name: {"boxes": int(box_counts[c]), "images": int(images_per_class[c])}
+            for c, name in class_names.items() if c < num_classes
+        },
+        "boxes_per_image": {**_quantiles(counts.astype(np.float64)), "histogram": dict(zip(bin_labels, hist.tolist()))},
+        "box_width": _quantiles(widths),
+        "box_height": _quantiles(heights),
+        "aspect_ratio": _quantiles(aspect),
+    }
+    if img_size is not None:
+        areas = widths * heights
+        small, medium = COCO_AREA_THRESHOLDS
+        stats["area"] = {
+            "small": int((areas < small).sum()),
+            "medium": int(((areas >= small) & (areas < medium)).sum()),
+            "large": int((areas >= medium).sum()),
+        }
+    unknown = int((~known).sum())
+    if unknown:
+        stats["unknown_class_boxes"] = unknown
+    return stats
+
+
+def image_to_label_path(image_path: str) -> Path:
+    """与Ultralytics相同的规则：把路径中的 /images/ 换成 /labels/，扩展名换成 .txt。"""
+    sep = os.sep
+    label = image_path.replace(f"{sep}images{sep}", f"{sep}labels{sep}")
+    return Path(label).with_suffix('.txt')
+
+
+def dataset_image_paths(yaml_path: Path) -> dict:
+    """
+    解析数据集配置，返回 {split: 图片路径列表}。
+    train/val 可以是图片目录，也可以是图片列表 .txt（例如 split_bdd_dataset.py 生成的列表，重复的行会被保留）。
+    """
+    with open(yaml_path) as f:
+        config = yaml.safe_load(f)
+    root = Path(config.get('path', Path(yaml_path).parent))
+    result = {}
+    for split in ("train", "val", "test"):
+        entry = config.get(split)
+        if not entry:
+            continue
+        source = root / entry
+        if source.suffix == '.txt' and source.is_file():
+            with open(source) as f:
+                lines = [line.strip() for line in f if line.strip()]
+            image_paths = [str(source.parent / line[2:]) if line.startswith('./') else line for line in lines]
+        elif source.is_dir():
+            image_paths = sorted(str(p) for p in source.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+        else:
+            print(f"警告：{split} 的数据来源 {source} 不存在，跳过。")
+            continue
+        result[split] = image_paths
+    return result
+
+
+def dataset_label_paths(yaml_path: Path) -> dict:
+    """解析数据集配置，返回 {split: 标签路径列表}（与 dataset_image_paths 的图片一一对应）。"""
+    return {split: [image_to_label_path(p) for p in paths] for split, paths in dataset_image_paths(yaml_path).items()}
+
+
+def label_stats(label_paths, class_names: dict, img_size=None, num_workers: int = 1, cache_dir: Path = None) -> dict:
+    """
+    统计一组标签文件（带缓存）。缓存键为类别表和所有标签文件 (路径, mtime, 大小) 的指纹，
+    标签没变时直接返回上一次的结果。标签都在同一个目录且存在对应的打包标签时，直接从打包标签读取。
+    """
+    label_paths = [Path(p) for p in label_paths]
+    fingerprint = label_fingerprint(label_paths)
+    key = hashlib.sha1(f"{fingerprint}:{sorted(class_names.items())}:{img_size}".encode()).hexdigest()
+
+    cache_path = Path(cache_dir) / f"{key}.json" if cache_dir is not None else None
+    if cache_path is not None and cache_path.exists():
+        with open(cache_path) as f:
+            return json.load(f)
+
+    parents = {p.parent for p in label_paths}
+    packed_dir = None
+    if len(parents) == 1:
+        label_dir = parents.pop()
+        packed_dir = label_dir.with_name(f"{label_dir.name}.packed")
+    if packed_dir is not None and packed_dir.exists():
+        boxes, counts = collect_packed(PackedLabelStore(packed_dir), [p.stem for p in label_paths])
+    else:
+        boxes, counts = collect_labels(label_paths, num_workers=num_workers)
+
+    stats = compute_stats(boxes, counts, class_names, img_size)
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+    return stats
+
+
+def print_stats(title: str, stats: dict):
+    """以易读的形式打印统计结果。"""
+    print(f"\n--- {title} ---")
+    print(f"图片数: {stats['num_images']}，框数: {stats['num_boxes']}，空标签图片: {stats['num_empty_images']}")
+    print("按类别统计（框数 / 出现的图片数）：")
+    for name, item in stats["classes"].items():
+        print(f"  - {name}: {item['boxes']} / {item['images']}")
+    bpi = stats["boxes_per_image"]
+    if "mean" in bpi:
+        print(f"每张图片的框数: 平均 {bpi['mean']:.1f}，中位数 {bpi['p50']:.0f}，P95 {bpi['p95']:.0f}，最多 {bpi['max']:.0f}")
+    print(f"框数分布: {bpi['histogram']}")
+    for key, label in [("box_width", "框宽"), ("box_height", "框高"), ("aspect_ratio", "宽高比")]:
+        q = stats[key]
+        if q:
+            print(f"{label}: P5 {q['p5']:.3f}，中位数 {q['p50']:.3f}，P95 {q['p95']:.3f}")
+    if "area" in stats:
+        print(f"COCO尺寸分布: {stats['area']}")
+    if "unknown_class_boxes" in stats:
+        print(f"⚠️ 有 {stats['unknown_class_boxes']} 个框的类别ID不在类别表中！")
+
+
+def main():
+    """
+    主函数，统计 config/ 下各数据集配置所指向的标签。
+    """
+    # 并行读取标签的进程数
+    NUM_WORKERS = os.cpu_count() or 1
+    # 每个数据集的图片尺寸（用于按像素统计目标大小），未知时设为 None
+    IMAGE_SIZES = {"bdd100k.yaml": (1280, 720), "pennfudan.yaml": None}
+
+    print("--- 开始统计数据集标签 ---")
+    project_root = Path(__file__).parent.parent
+    cache_dir = project_root / "data" / "cache" / "label_stats"
+
+    for yaml_path in sorted((project_root / "config").glob("*.yaml")):
+        with open(yaml_path) as f:
+            class_names = yaml.safe_load(f).get('names', {})
+        if not class_names:
+            continue
+        for split, label_paths in dataset_label_paths(yaml_path).items():
+            stats = label_stats(label_paths, class_names, IMAGE_SIZES.get(yaml_path.name),
+                                num_workers=NUM_WORKERS, cache_dir=cache_dir)
+            print_stats(f"{yaml_path.stem} / {split}", stats)
+
+    print("\n✅ 统计完成！")
+
+if __name__ == '__main__':
+    main()
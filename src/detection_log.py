@@ -0,0 +1,166 @@
+import json
+from pathlib import Path
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 没有 pyarrow 时退回到内存映射的二进制日志
+    pa = pq = None
+
+# 每个检测框一行；没有追踪ID（纯检测）时 track_id 为 -1
+DETECTION_DTYPE = np.dtype([
+    ('frame', '<i4'), ('track_id', '<i4'), ('cls', '<i2'),
+    ('x1', '<f4'), ('y1', '<f4'), ('x2', '<f4'), ('y2', '<f4'), ('score', '<f4'),
+])
+
+
+def default_log_path(output_stem: Path) -> Path:
+    """有 pyarrow 时写 Parquet，否则写二进制日志。output_stem 不带扩展名。"""
+    return Path(output_stem).with_suffix('.parquet' if pq is not None else '.bin')
+
+
+def results_to_records(frame_index: int, results) -> np.ndarray:
+    """把一帧的 Results 转换成 DETECTION_DTYPE 的结构化数组。"""
+    data = results.boxes.data.cpu().numpy() if results.boxes is not None else np.zeros((0, 6))
+    records = np.empty(len(data), dtype=DETECTION_DTYPE)
+    records['frame'] = frame_index
+    records['track_id'] = data[:, 4] if data.shape[1] == 7 else -1
+    records['cls'] = data[:, -1]
+    for i, name in enumerate(('x1', 'y1', 'x2', 'y2')):
+        records[name] = data[:, i]
+    records['score'] = data[:, -2]
+    return records
+
+
+class DetectionLogWriter:
+    """
+    在推理过程中逐帧收集检测结果，攒够 batch_rows 行后批量写入磁盘：
+      - .parquet：每批写成一个 row group（需要 pyarrow）；
+      - .bin：结构化记录直接追加到文件末尾，元数据（dtype、类别名、fps）写在同名的 .json 中，
+        读取时用 np.memmap 零拷贝打开。
+    add(frame_index, results) 可以直接作为 run_video_pipeline 的 on_result。
+    """
+
+    def __init__(self, path: Path, names: dict = None, fps: float = None, batch_rows: int = 65536):
+        self.path = Path(path)
+        self.names = {int(k): v for k, v in (names or {}).items()}
+        self.fps = fps
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self.frames = 0
+        self._buffer = []
+        self._buffered = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.parquet = self.path.suffix == '.parquet'
+        if self.parquet:
+            if pq is None:
+                raise ImportError("写 Parquet 需要安装 pyarrow，或者改用 .bin 日志")
+            schema = pa.schema([(name, pa.from_numpy_dtype(DETECTION_DTYPE[name])) for name in DETECTION_DTYPE.names])
+            schema = schema.with_metadata({"detection_log": json.dumps(self._metadata(), ensure_ascii=False)})
+            self._writer = pq.ParquetWriter(str(self.path), schema, compression='zstd')
+        else:
+            self._writer = open(self.path, 'wb')
+
+    def _metadata(self) -> dict:
+        return {"names": self.names, "fps": self.fps,
+                "dtype": [[name, DETECTION_DTYPE[name].str] for name in DETECTION_DTYPE.names]}
+
+    def add(self, frame_index: int, results):
+        records = results_to_records(frame_index, results)
+        self.frames = max(self.frames, frame_index + 1)
+        if len(records):
+            self._buffer.append(records)
+            self._buffered += len(records)
+        if self._buffered >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        records = np.concatenate(self._buffer)
+        if self.parquet:
+            table = pa.table({name: records[name] for name in DETECTION_DTYPE.names})
+            self._writer.write_table(table)
+        else:
+            self._writer.write(records.tobytes())
+        self.rows += len(records)
+        self._buffer, self._buffered = [], 0
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        if not self.parquet:
+            with open(self.path.with_suffix('.json'), 'w') as f:
+                json.dump({**self._metadata(), "rows": self.rows, "frames": self.frames}, f, ensure_ascii=False, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_detection_log(path: Path):
+    """
+    读取检测日志，返回 (结构化数组, 元数据)。
+    .bin 日志通过 np.memmap 打开，不会把整个文件读入内存。
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        if pq is None:
+            raise ImportError("读取 Parquet 需要安装 pyarrow")
+        table = pq.read_table(str(path))
+        raw_meta = (table.schema.metadata or {}).get(b"detection_log")
+        metadata = json.loads(raw_meta) if raw_meta else {}
+        records = np.empty(table.num_rows, dtype=DETECTION_DTYPE)
+        for name in DETECTION_DTYPE.names:
+            records[name] = table.column(name).to_numpy()
+        return records, metadata
+
+    with open(path.with_suffix('.json')) as f:
+        metadata = json.load(f)
+    dtype = np.dtype([(name, code) for name, code in metadata["dtype"]])
+    if metadata["rows"] == 0:
+        return np.empty(0, dtype=dtype), metadata
+    return np.memmap(path, dtype=dtype, mode='r', shape=(metadata["rows"],)), metadata
+
+
+def summarize_log(records: np.ndarray, names: dict) -> dict:
+    """按类别统计框数和不同追踪ID的数量。"""
+    summary = {}
+    for cls in np.unique(records['cls']):
+        mask = records['cls'] == cls
+        ids = records['track_id'][mask]
+        summary[names.get(str(cls), names.get(int(cls), str(cls)))] = {
+            "boxes": int(mask.sum()),
+            "tracks": int(len(np.unique(ids[ids >= 0]))),
+        }
+    return summary
+
+
+def main():
+    """
+    主函数，读取 results/ 下的检测日志并打印每个类别的框数和目标数（不需要重新解码视频）。
+    """
+    print("--- 开始汇总检测日志 ---")
+    project_root = Path(__file__).parent.parent
+    log_paths = sorted(list((project_root / "results").glob("*_detections.parquet")) +
+                       list((project_root / "results").glob("*_detections.bin")))
+    if not log_paths:
+        print("❌ 错误：results/ 下没有找到检测日志")
+        return
+
+    for log_path in log_paths:
+        records, metadata = read_detection_log(log_path)
+        frames = int(records['frame'].max()) + 1 if len(records) else 0
+        print(f"\n{log_path.name}: {len(records)} 个框，覆盖 {frames} 帧")
+        for name, item in summarize_log(records, metadata.get("names", {})).items():
+            tracks = f"，{item['tracks']} 个不同的追踪ID" if item['tracks'] else ""
+            print(f"  - {name}: {item['boxes']} 个框{tracks}")
+
+    print("\n✅ 汇总完成！")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import time
+from pathlib import Path
+import numpy as np
+import yaml
+from dataset_stats import image_to_label_path
+from packed_labels import parse_yolo_txt
+from yolo_box_ops import yolo_to_xyxy
+
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+# mAP50-95 使用的10个IoU阈值
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# PR曲线在置信度上的采样点数（与 Ultralytics 一致）
+CURVE_POINTS = 1000
+
+
+def load_ground_truth(predictions: dict) -> dict:
+    """
+    按 predictions（PredictionCache.predict 的返回值）中的图片读取YOLO标签，
+    用缓存里记录的原图尺寸换算成像素坐标。返回 {图片路径: (类别数组, xyxy数组)}。
+    """
+    ground_truth = {}
+    for image_path, ((height, width), _) in predictions.items():
+        label_path = image_to_label_path(image_path)
+        rows = parse_yolo_txt(label_path) if label_path.exists() else np.empty((0, 5))
+        ground_truth[image_path] = (rows[:, 0].astype(np.int64), yolo_to_xyxy(rows[:, 1:], width, height))
+    return ground_truth
+
+
+def average_precision(recall: np.ndarray, precision: np.ndarray):
+    """
+    与 Ultralytics 相同的AP计算：先取精确率的包络线，再在101个召回率点上插值积分。
+    recall / precision 可以是一维数组，也可以是 (n, T) 的数组（每列一个IoU阈值），返回标量或 (T,) 数组。
+    """
+    recall, precision = np.asarray(recall, dtype=np.float64), np.asarray(precision, dtype=np.float64)
+    squeeze = recall.ndim == 1
+    if squeeze:
+        recall, precision = recall[:, None], precision[:, None]
+    columns = recall.shape[1]
+    mrec = np.concatenate([np.zeros((1, columns)), recall, np.ones((1, columns))])
+    mpre = np.concatenate([np.ones((1, columns)), precision, np.zeros((1, columns))])
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre, axis=0), axis=0), axis=0)
+    x = np.linspace(0, 1, 101)
+    ap = np.array([_trapezoid(np.interp(x, mrec[:, j], mpre[:, j]), x) for j in range(columns)])
+    return float(ap[0]) if squeeze else ap
+
+
+def _flatten(predictions: dict, ground_truth: dict, class_ids, conf: float):
+    """把所有图片的检测和真值拼接成大数组，并记录每张图片的检测数和真值数。"""
+    class_ids = np.asarray(class_ids, dtype=np.int64)
+    dets, gts_cls, gts_xyxy, det_counts, gt_counts = [], [], [], [], []
+    for image_path, (_, det) in predictions.items():
+        det = det[(det[:, 4] >= conf) & np.isin(det[:, 5].astype(np.int64), class_ids)]
+        gt_cls, gt_xyxy = ground_truth[image_path]
+        keep = np.isin(gt_cls, class_ids)
+        dets.append(det)
+        gts_cls.append(gt_cls[keep])
+        gts_xyxy.append(gt_xyxy[keep])
+        det_counts.append(len(det))
+        gt_counts.append(int(keep.sum()))
+    det = np.concatenate(dets).astype(np.float64) if dets else np.zeros((0, 6))
+    gt_cls = np.concatenate(gts_cls) if gts_cls else np.zeros(0, dtype=np.int64)
+    gt_xyxy = np.concatenate(gts_xyxy) if gts_xyxy else np.zeros((0, 4))
+    return det, gt_cls, gt_xyxy, np.array(det_counts, dtype=np.int64), np.array(gt_counts, dtype=np.int64)
+
+
+def _padded(values: np.ndarray, counts: np.ndarray, starts: np.ndarray, width: int, fill=0):
+    """把按图片拼接的数组填充成 (图片数, width, ...) 的规整数组，返回 (填充后的数组, 有效位置掩码)。"""
+    valid = np.arange(width)[None, :] < counts[:, None]
+    index = np.where(valid, starts[:, None] + np.arange(width)[None, :], 0)
+    padded = values[index]
+    padded[~valid] = fill
+    return padded, valid
+
+
+def match_detections(det, gt_cls, gt_xyxy, det_counts, gt_counts, iou_thresholds=IOU_THRESHOLDS,
+                     chunk_images: int = 256) -> np.ndarray:
+    """
+    批量匹配所有图片的检测和真值，返回 (检测数, IoU阈值数) 的TP矩阵。
+    每次取 chunk_images 张图片，填充成 (图片, 检测, 真值) 的三维数组一次算出全部IoU，
+    再把所有 IoU >= 最低阈值 且类别相同的 (检测, 真值) 对拼成一张全局表，
+    每个IoU阈值的匹配都只在这张表上做排序和去重（与 YOLO.val 的 match_predictions 规则相同）。
+    """
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    tp = np.zeros((len(det), len(iou_thresholds)), dtype=bool)
+    if len(det) == 0 or len(gt_cls) == 0:
+        return tp
+
+    det_starts = np.concatenate([[0], np.cumsum(det_counts)[:-1]])
+    gt_starts = np.concatenate([[0], np.cumsum(gt_counts)[:-1]])
+    det_cls = det[:, 5].astype(np.int64)
+    pair_det, pair_gt, pair_iou = [], [], []
+    for lo in range(0, len(det_counts), chunk_images):
+        hi = min(lo + chunk_images, len(det_counts))
+        dc, gc = det_counts[lo:hi], gt_counts[lo:hi]
+        if dc.max() == 0 or gc.max() == 0:
+            continue
+        d_boxes, d_valid = _padded(det[:, :4], dc, det_starts[lo:hi], int(dc.max()))
+        d_cls, _ = _padded(det_cls, dc, det_starts[lo:hi], int(dc.max()), fill=-1)
+        g_boxes, g_valid = _padded(gt_xyxy, gc, gt_starts[lo:hi], int(gc.max()))
+        g_cls, _ = _padded(gt_cls, gc, gt_starts[lo:hi], int(gc.max()), fill=-2)
+
+        tl = np.maximum(d_boxes[:, :, None, :2], g_boxes[:, None, :, :2])
+        br = np.minimum(d_boxes[:, :, None, 2:], g_boxes[:, None, :, 2:])
+        inter = np.clip(br - tl, 0, None).prod(axis=3)
+        d_area = (d_boxes[..., 2:] - d_boxes[..., :2]).prod(axis=2)
+        g_area = (g_boxes[..., 2:] - g_boxes[..., :2]).prod(axis=2)
+        iou = inter / (d_area[:, :, None] + g_area[:, None, :] - inter + 1e-9)
+
+        ok = (iou >= iou_thresholds.min()) & (d_cls[:, :, None] == g_cls[:, None, :])
+        ok &= d_valid[:, :, None] & g_valid[:, None, :]
+        b, d, g = np.nonzero(ok)
+        pair_det.append(det_starts[lo + b] + d)
+        pair_gt.append(gt_starts[lo + b] + g)
+        pair_iou.append(iou[b, d, g])
+
+    if not pair_det:
+        return tp
+    pair_det, pair_gt, pair_iou = np.concatenate(pair_det), np.concatenate(pair_gt), np.concatenate(pair_iou)
+    order = np.argsort(-pair_iou, kind='stable')
+    pair_det, pair_gt, pair_iou = pair_det[order], pair_gt[order], pair_iou[order]
+    for j, threshold in enumerate(iou_thresholds):
+        sel = pair_iou >= threshold
+        d, g = pair_det[sel], pair_gt[sel]
+        # 每个检测先保留IoU最高的一对（去重后按检测序号排列），再让每个真值保留序号最小（置信度最高）的检测
+        _, first = np.unique(d, return_index=True)
+        d, g = d[first], g[first]
+        _, first = np.unique(g, return_index=True)
+        tp[d[first], j] = True
+    return tp
+
+
+def _smooth(y: np.ndarray, fraction: float = 0.05) -> np.ndarray:
+    """盒式滤波平滑（与 Ultralytics 选最佳F1置信度时的做法一致）。"""
+    nf = round(len(y) * fraction * 2) // 2 + 1
+    p = np.ones(nf // 2)
+    yp = np.concatenate((p * y[0], y, p * y[-1]))
+    return np.convolve(yp, np.ones(nf) / nf, mode='valid')
+
+
+def evaluate_detections(predictions: dict, ground_truth: dict, class_ids, conf: float = 0.001,
+                        iou_threshold: float = 0.5, conf_grid=None, iou_thresholds=IOU_THRESHOLDS) -> dict:
+    """
+    一次匹配，算出所有指标：
+      - 每个类别在每个IoU阈值下的AP → ap50、ap50_95 以及 iou_threshold 下的 ap（map 为其类别平均）；
+      - precision / recall：置信度 >= conf 的全部检测在 iou_threshold 下的精确率和召回率；
+      - IoU=0.5 的PR曲线（在 CURVE_POINTS 个置信度上采样）和最佳F1点（对应 YOLO.val 打印的 P / R）；
+      - conf_grid 中每个置信度阈值下的 P、R、F1 和 mAP50，不需要为每个阈值重新匹配。
+    与 YOLO.val(conf=...) 一样，先丢掉置信度低于 conf 的检测；只统计 class_ids 中的类别。
+    """
+    class_ids = [int(c) for c in class_ids]
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    if not np.isclose(iou_thresholds, iou_threshold).any():
+        iou_thresholds = np.sort(np.append(iou_thresholds, iou_threshold))
+    col = int(np.argmin(np.abs(iou_thresholds - iou_threshold)))
+    col50 = int(np.argmin(np.abs(iou_thresholds - 0.5)))
+    coco_cols = np.isclose(iou_thresholds[:, None], IOU_THRESHOLDS[None, :]).any(axis=1)
+
+    det, gt_cls, gt_xyxy, det_counts, gt_counts = _flatten(predictions, ground_truth, class_ids, conf)
+    tp = match_detections(det, gt_cls, gt_xyxy, det_counts, gt_counts, iou_thresholds)
+
+    order = np.argsort(-det[:, 4], kind='stable')
+    tp, scores, pred_cls = tp[order], det[order, 4], det[order, 5].astype(np.int64)
+    conf_grid = np.asarray(conf_grid if conf_grid is not None else [], dtype=np.float64)
+    px = np.linspace(0, 1, CURVE_POINTS)
+
+    n_classes = len(class_ids)
+    p_curve, r_curve = np.zeros((n_classes, CURVE_POINTS)), np.zeros((n_classes, CURVE_POINTS))
+    grid_p, grid_r, grid_ap50 = (np.zeros((n_classes, len(conf_grid))) for _ in range(3))
+    per_class = {}
+    for k, c in enumerate(class_ids):
+        mask = pred_cls == c
+        n_gt = int((gt_cls == c).sum())
+        tpc = np.cumsum(tp[mask], axis=0)
+        recall = tpc / max(n_gt, 1)
+        precision = tpc / np.arange(1, len(tpc) + 1)[:, None]
+        ap = average_precision(recall, precision) if n_gt and len(tpc) else np.zeros(len(iou_thresholds))
+        if len(tpc):
+            p_curve[k] = np.interp(-px, -scores[mask], precision[:, col50], left=1)
+            r_curve[k] = np.interp(-px, -scores[mask], recall[:, col50], left=0)
+        # 置信度阈值网格：按阈值截断同一条累计曲线，不需要重新匹配
+        kept = np.searchsorted(-scores[mask], -conf_grid, side='right')
+        for g, n_keep in enumerate(kept):
+            if n_keep == 0:
+                continue
+            grid_p[k, g] = tpc[n_keep - 1, col50] / n_keep
+            grid_r[k, g] = tpc[n_keep - 1, col50] / max(n_gt, 1)
+            if n_gt:
+                grid_ap50[k, g] = average_precision(recall[:n_keep, col50], precision[:n_keep, col50])
+        n_tp = int(tpc[-1, col]) if len(tpc) else 0
+        per_class[c] = {
+            "ap": float(ap[col]),
+            "ap50": float(ap[col50]),
+            "ap50_95": float(ap[coco_cols].mean()),
+            "precision": n_tp / len(tpc) if len(tpc) else 0.0,
+            "recall": n_tp / n_gt if n_gt else 0.0,
+            "instances": n_gt,
+        }
+
+    # 与 YOLO.val 一样，只对验证集中出现过的类别取平均
+    present_idx = [k for k, c in enumerate(class_ids) if per_class[c]["instances"] > 0] or list(range(n_classes))
+    present = [class_ids[k] for k in present_idx]
+    f1_curve = 2 * p_curve * r_curve / (p_curve + r_curve + 1e-16)
+    best = int(_smooth(f1_curve[present_idx].mean(axis=0), 0.1).argmax()) if n_classes else 0
+    grid_f1 = 2 * grid_p * grid_r / (grid_p + grid_r + 1e-16)
+
+    def mean(key):
+        return float(np.mean([per_class[c][key] for c in present])) if present else 0.0
+
+    return {
+        "iou_threshold": iou_threshold,
+        "conf": conf,
+        "precision": mean("precision"),
+        "recall": mean("recall"),
+        "map": mean("ap"),
+        "map50": mean("ap50"),
+        "map50_95": mean("ap50_95"),
+        "best_f1": {
+            "conf": float(px[best]),
+            "precision": float(p_curve[present_idx, best].mean()),
+            "recall": float(r_curve[present_idx, best].mean()),
+            "f1": float(f1_curve[present_idx, best].mean()),
+        },
+        "per_class": per_class,
+        "curves": {"conf": px, "precision": p_curve, "recall": r_curve, "f1": f1_curve, "class_ids": class_ids},
+        "conf_grid": [
+            {"conf": float(c), "precision": float(grid_p[present_idx, g].mean()),
+             "recall": float(grid_r[present_idx, g].mean()), "f1": float(grid_f1[present_idx, g].mean()),
+             "map50": float(grid_ap50[present_idx, g].mean())}
+            for g, c in enumerate(conf_grid)
+        ],
+    }
+
+
+
+def per_image_errors(predictions: dict, ground_truth: dict, class_ids, conf: float = 0.25,
+                     iou_threshold: float = 0.5) -> dict:
+    """
+    逐图片统计置信度 >= conf 的检测在 iou_threshold 下的匹配情况：
+    漏检 = 没有匹配到检测的真值，误检 = 没有匹配到真值的检测。
+    返回 {图片路径: {"gt", "detections", "tp", "missed", "extra"}}。
+    """
+    det, gt_cls, gt_xyxy, det_counts, gt_counts = _flatten(predictions, ground_truth, class_ids, conf)
+    tp = match_detections(det, gt_cls, gt_xyxy, det_counts, gt_counts, [iou_threshold])[:, 0]
+    image_index = np.repeat(np.arange(len(det_counts)), det_counts)
+    tp_counts = np.bincount(image_index, weights=tp, minlength=len(det_counts)).astype(np.int64)
+    errors = {}
+    for i, image_path in enumerate(predictions):
+        n_gt, n_det, n_tp = int(gt_counts[i]), int(det_counts[i]), int(tp_counts[i])
+        errors[image_path] = {"gt": n_gt, "detections": n_det, "tp": n_tp,
+                              "missed": n_gt - n_tp, "extra": n_det - n_tp}
+    return errors
+
+def main():
+    """
+    主函数，在 Penn-Fudan 验证集上比较独立评估器与 YOLO.val 的结果和耗时。
+    """
+    # 一次评估中要扫描的置信度阈值
+    CONF_GRID = [0.05, 0.1, 0.25, 0.4, 0.5, 0.6, 0.75]
+
+    from ultralytics import YOLO
+    from dataset_stats import dataset_image_paths
+    from prediction_cache import PredictionCache, default_prediction_cache_dir
+
+    print("--- 开始对比独立评估器与 YOLO.val ---")
+    project_root = Path(__file__).parent.parent
+    model_path = project_root / "runs/detect/yolov8m_final_tuning_v4/weights/best.pt"
+    data_yaml = project_root / "config/pennfudan.yaml"
+    if not model_path.exists():
+        print(f"❌ 错误：找不到模型文件: {model_path}")
+        return
+
+    model = YOLO(model_path)
+    with open(data_yaml) as f:
+        class_ids = list(yaml.safe_load(f)['names'].keys())
+    val_images = dataset_image_paths(data_yaml)['val']
+
+    start = time.perf_counter()
+    metrics_val = model.val(data=str(data_yaml), split='val', verbose=False, plots=False)
+    val_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with PredictionCache(default_prediction_cache_dir(project_root), model_path) as cache:
+        predictions = cache.predict(model, val_images)
+    predict_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ground_truth = load_ground_truth(predictions)
+    metrics = evaluate_detections(predictions, ground_truth, class_ids, conf_grid=CONF_GRID)
+    eval_seconds = time.perf_counter() - start
+
+    print(f"\n{'':<14} {'P':>7} {'R':>7} {'mAP50':>7} {'mAP50-95':>9} {'耗时(秒)':>9}")
+    print(f"{'YOLO.val':<14} {metrics_val.box.mp:>7.3f} {metrics_val.box.mr:>7.3f} {metrics_val.box.map50:>7.3f} "
+          f"{metrics_val.box.map:>9.3f} {val_seconds:>9.2f}")
+    best = metrics["best_f1"]
+    print(f"{'独立评估器':<14} {best['precision']:>7.3f} {best['recall']:>7.3f} {metrics['map50']:>7.3f} "
+          f"{metrics['map50_95']:>9.3f} {eval_seconds:>9.2f}")
+    print(f"（独立评估器的预测来自缓存，本次获取预测用时 {predict_seconds:.2f} 秒；之后换阈值只需要评估的时间。"
+          f"YOLO.val 使用矩形batch推理，数值会有少许差异）")
+
+    print("\n置信度阈值扫描：")
+    print(f"{'conf':>6} {'P':>7} {'R':>7} {'F1':>7} {'mAP50':>7}")
+    for row in metrics["conf_grid"]:
+        print(f"{row['conf']:>6.2f} {row['precision']:>7.3f} {row['recall']:>7.3f} {row['f1']:>7.3f} {row['map50']:>7.3f}")
+
+    print("\n✅ 评估完成！")
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,20 @@ import numpy  # 优先导入，避免MKL库冲突
 from ultralytics import YOLO
 from pathlib import Path
 import torch
+from class_mapping import load_class_mappings
+from dataset_stats import dataset_image_paths
+from detection_metrics import evaluate_detections, load_ground_truth
+from prediction_cache import PredictionCache, default_prediction_cache_dir
 
 def main():
     """
     主函数，用于评估我们所有训练好的模型，
     并使用导师要求的 IoU=0.5 标准。
     """
+    # 跨数据集测试要使用的类别映射（定义在 config/class_mappings.yaml 中）
+    # 所有映射共用同一份预测缓存，每增加一种映射只多一次评估，不需要再跑模型
+    CROSS_DATASET_MAPPINGS = ["bdd100k_to_pennfudan", "bdd100k_to_pennfudan_with_rider"]
+
     # --- 0. 环境和路径定义 ---
     print("--- 开始执行评估脚本 ---")
     device = 0 if torch.cuda.is_available() else 'cpu'
@@ -75,17 +83,24 @@ def main():
     print("="*50)
     if 'model_bdd' in locals():
         # 我们重用上面已经加载的 BDD100K 模型
-        metrics_cross = model_bdd.val(
-            data=str(pennfudan_yaml), # 使用 Penn-Fudan 的“地图”
-            iou=0.5,
-	    conf=0.1,
-            split='val',
-            device=device
-        )
-        print("\n--- 跨数据集测试结果 (BDD模型 vs Penn数据): ---")
-        print(f"Precision (精确率): {metrics_cross.box.mp:.3f}")
-        print(f"Recall (召回率):    {metrics_cross.box.mr:.3f}")
-        print(f"mAP@50:             {metrics_cross.box.map50:.3f}")
+        # 预测只跑一次并缓存（键为 权重哈希 + 图片哈希 + imgsz + NMS IoU），之后换 conf 阈值或类别映射都直接从缓存评估
+        # NMS IoU=0.5、conf=0.1 与原来的 model_bdd.val(iou=0.5, conf=0.1) 一致
+        mappings = load_class_mappings(project_root / "config/class_mappings.yaml")
+        with PredictionCache(default_prediction_cache_dir(project_root), bdd100k_model_path, nms_iou=0.5) as cache:
+            for mapping_name in CROSS_DATASET_MAPPINGS:
+                mapping = mappings[mapping_name]
+                val_images = dataset_image_paths(mapping.dataset_yaml)['val']
+                predictions = cache.predict(model_bdd, val_images, device=device)
+                ground_truth = mapping.apply_to_ground_truth(load_ground_truth(predictions))
+                metrics_cross = evaluate_detections(mapping.apply_to_predictions(predictions), ground_truth,
+                                                    mapping.class_ids, conf=0.1, iou_threshold=0.5)
+                print(f"\n--- 跨数据集测试结果 ({mapping.describe()}): ---")
+                # 与 YOLO.val 打印的 box.mp / box.mr 一样，取最佳F1点的精确率和召回率
+                best = metrics_cross['best_f1']
+                print(f"Precision (精确率): {best['precision']:.3f}")
+                print(f"Recall (召回率):    {best['recall']:.3f}")
+                print(f"mAP@50:             {metrics_cross['map50']:.3f}")
+                print(f"mAP@50-95:          {metrics_cross['map50_95']:.3f}")
     else:
         print("❌ BDD100K模型未加载，跳过跨数据集测试。")
 
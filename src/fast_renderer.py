@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+from ultralytics.utils.plotting import colors
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+# 标签图块缓存的上限（追踪ID不断增加，缓存满了就清空重建）
+GLYPH_CACHE_SIZE = 4096
+
+
+class FastRenderer:
+    """
+    轻量的标注绘制器，用来替代 results.plot()：
+      - 直接在解码出来的帧上画框（不复制整帧），返回的就是 results.orig_img；
+      - 类别颜色表只建一次，线宽和字号按分辨率只算一次；
+      - 每个标签文字（带底色）只用 cv2.putText 渲染一次，之后直接把缓存的小图块拷贝到帧上。
+    show_conf / show_id 控制标签里是否带置信度和追踪ID，show_labels=False 时只画框。
+    """
+
+    def __init__(self, names: dict = None, line_width: int = None, show_labels: bool = True,
+                 show_conf: bool = True, show_id: bool = True):
+        self.names = names
+        self.line_width = line_width
+        self.show_labels = show_labels
+        self.show_conf = show_conf
+        self.show_id = show_id
+        self._palette = None
+        self._glyphs = {}
+        self._shape = None
+        self._lw = self._font_scale = self._thickness = None
+
+    def _setup(self, results, shape):
+        if self.names is None:
+            self.names = results.names
+        if self._palette is None:
+            num_classes = max(self.names) + 1 if self.names else 1
+            self._palette = [colors(i, True) for i in range(num_classes)]
+        if shape != self._shape:
+            # 与 Ultralytics 的默认值一致：线宽随图片尺寸变化
+            self._lw = self.line_width or max(round(sum(shape[:2]) / 2 * 0.003), 2)
+            self._thickness = max(self._lw - 1, 1)
+            self._font_scale = self._lw / 3
+            self._shape = shape
+            self._glyphs.clear()
+
+    def _glyph(self, text: str, color) -> np.ndarray:
+        key = (text, color)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            if len(self._glyphs) >= GLYPH_CACHE_SIZE:
+                self._glyphs.clear()
+            (w, h), baseline = cv2.getTextSize(text, FONT, self._font_scale, self._thickness)
+            pad = max(self._lw // 2, 1)
+            glyph = np.empty((h + baseline + 2 * pad, w + 2 * pad, 3), dtype=np.uint8)
+            glyph[:] = color
+            # 浅色底配黑字，深色底配白字
+            text_color = (0, 0, 0) if sum(color) * 0.333 > 150 else (255, 255, 255)
+            cv2.putText(glyph, text, (pad, pad + h), FONT, self._font_scale, text_color, self._thickness, cv2.LINE_AA)
+            self._glyphs[key] = glyph
+        return glyph
+
+    def _label(self, cls: int, conf: float, track_id) -> str:
+        parts = []
+        if self.show_id and track_id is not None:
+            parts.append(f"id:{track_id}")
+        parts.append(str(self.names.get(cls, cls)))
+        if self.show_conf:
+            parts.append(f"{conf:.2f}")
+        return " ".join(parts)
+
+    @staticmethod
+    def _paste(image: np.ndarray, glyph: np.ndarray, x: int, y: int):
+        """把标签图块贴到 (x, y) 处（左上角），超出图片的部分裁掉。"""
+        height, width = image.shape[:2]
+        gh, gw = glyph.shape[:2]
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + gw, width), min(y + gh, height)
+        if x2 > x1 and y2 > y1:
+            image[y1:y2, x1:x2] = glyph[y1 - y:y2 - y, x1 - x:x2 - x]
+
+    def __call__(self, results) -> np.ndarray:
+        image = results.orig_img
+        self._setup(results, image.shape)
+        data = results.boxes.data.cpu().numpy() if results.boxes is not None else np.zeros((0, 6))
+        if len(data) == 0:
+            return image
+
+        boxes = data[:, :4].round().astype(np.int32)
+        confs, class_ids = data[:, -2], data[:, -1].astype(np.int64)
+        track_ids = data[:, 4].astype(np.int64) if data.shape[1] == 7 else None
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            cls = int(class_ids[i])
+            color = self._palette[cls] if 0 <= cls < len(self._palette) else colors(cls, True)
+            cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color, self._lw, cv2.LINE_AA)
+            if not self.show_labels:
+                continue
+            track_id = int(track_ids[i]) if track_ids is not None else None
+            glyph = self._glyph(self._label(cls, float(confs[i]), track_id), color)
+            # 标签放在框的上方，放不下时放到框内
+            top = y1 - glyph.shape[0] if y1 - glyph.shape[0] >= 0 else y1
+            self._paste(image, glyph, int(x1), int(top))
+        return image
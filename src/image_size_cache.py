@@ -0,0 +1,123 @@
+import json
+import os
+import struct
+from pathlib import Path
+from PIL import Image
+
+# BDD100K 的所有帧都是 1280x720，可以直接跳过读取图片
+BDD100K_IMAGE_SIZE = (1280, 720)
+
+# JPEG 中携带宽高信息的 SOF 段标记（排除 DHT=0xC4、JPG=0xC8、DAC=0xCC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _read_jpeg_size(f):
+    """逐段扫描JPEG文件头，找到SOF段后返回 (宽, 高)，不解码任何像素。"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # 跳过填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        # 没有长度字段的独立标记
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(img_path: Path):
+    """
+    只读取图片文件头来获取 (宽, 高)。
+    支持JPEG和PNG，其他格式（或文件头异常时）退回到PIL的惰性读取。
+    """
+    with open(img_path, 'rb') as f:
+        head = f.read(24)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:2] == b'\xff\xd8':
+            size = _read_jpeg_size(f)
+            if size is not None:
+                return size
+    with Image.open(img_path) as img:
+        return img.size
+
+
+class ImageSizeCache:
+    """
+    持久化的图片尺寸索引，键为图片路径，并记录 mtime 和文件大小用于判断是否失效。
+    第一次运行时只读取图片文件头建立索引，之后的运行只需要 stat，不读取任何图片内容。
+    fixed_size 不为空时（例如BDD100K），直接返回该尺寸，完全不访问图片文件。
+    """
+
+    def __init__(self, cache_path: Path, fixed_size=None):
+        self.cache_path = Path(cache_path)
+        self.fixed_size = tuple(fixed_size) if fixed_size else None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"警告：尺寸缓存 {self.cache_path} 无法读取，将重新建立。错误: {e}")
+                self.entries = {}
+
+    def get(self, img_path: Path):
+        """返回图片的 (宽, 高)。"""
+        if self.fixed_size is not None:
+            self.hits += 1
+            return self.fixed_size
+
+        key = str(Path(img_path).resolve())
+        stat = os.stat(key)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            self.hits += 1
+            return entry[2], entry[3]
+
+        width, height = read_image_size(key)
+        self.entries[key] = [stat.st_mtime_ns, stat.st_size, width, height]
+        self.misses += 1
+        self._dirty = True
+        return width, height
+
+    def save(self):
+        """把新增的条目写回磁盘（先写临时文件再替换，避免中断时损坏缓存）。"""
+        if not self._dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.save()
+
+
+def default_cache_path(project_root: Path) -> Path:
+    """所有转换脚本共用的尺寸缓存位置。"""
+    return project_root / "data" / "cache" / "image_sizes.json"
@@ -1,12 +1,29 @@
-import cv2
 from ultralytics import YOLO
 from pathlib import Path
 import numpy # 最好导入一下，以防万一
+from detection_log import DetectionLogWriter, default_log_path
+from roi import ROIDetector
+from video_pipeline import print_pipeline_stats, run_video_pipeline
+from video_source import VideoSource
 
 def main():
     """
     主函数，使用在BDD100K上训练的模型进行视频推理。
     """
+    # 离线处理时每次前向推理的帧数（CPU节点上batch越大吞吐越高），设为1则逐帧推理
+    BATCH_SIZE = 8
+    # 凑满一个batch最多等待的秒数（处理实时流时可以调小以降低延迟）
+    MAX_BATCH_LATENCY = 0.05
+    # 感兴趣区域（默认关闭）：None = 整帧推理，"auto" = 根据前几秒的检测位置自动学习，
+    # 或者给出归一化的 (x1, y1, x2, y2)，例如 (0.0, 0.3, 1.0, 0.85) 去掉天空和车头
+    ROI = None
+    # 是否画框并写出结果视频；设为 False 时跳过绘制和编码，只做检测/追踪（最快）
+    RENDER_VIDEO = True
+    # 写视频的编码器："opencv"（cv2.VideoWriter + mp4v）、"ffmpeg"（管道 + 多线程x264）或 "auto"（有ffmpeg就用ffmpeg）
+    VIDEO_ENCODER = "auto"
+    # 是否把每帧的检测结果（帧号、追踪ID、类别、框、置信度）写成列式日志，之后分析时不需要重新跑推理
+    WRITE_DETECTIONS = True
+
     print("--- 开始使用BDD100K模型进行视频推理 ---")
 
     # --- 1. 定义路径 ---
@@ -24,6 +41,8 @@ def main():
     # 定义保存结果的输出视频路径
     output_video_path = project_root / "results/bdd_inference_output.mp4"
     output_video_path.parent.mkdir(exist_ok=True) # 如果results文件夹不存在就创建
+    # 检测日志：有 pyarrow 时为 .parquet，否则为 .bin + .json
+    detections_path = default_log_path(project_root / "results/bdd_inference_detections")
 
     # --- 2. 加载模型 ---
     if not model_path.exists():
@@ -40,37 +59,49 @@ def main():
         return
 
     print(f"正在处理视频文件: {input_video_path}")
-    # 使用 stream=True 可以更高效地处理视频流
-    results_generator = model.predict(source=str(input_video_path), stream=True)
-    
-    # 准备使用OpenCV写入视频
-    cap = cv2.VideoCapture(str(input_video_path))
-    if not cap.isOpened():
-        print(f"❌ 错误：无法打开视频文件: {input_video_path}")
+    # 解码、推理、标注+编码分别在不同的线程中进行，模型不再等待画框和写视频
+    # 多帧合成一个batch一起推理，结果按帧顺序写回
+    def infer_fn(frames):
+        return model.predict(frames, verbose=False)
+
+    # 只打开一次输入视频：解码器和 fps/分辨率 都来自同一个 VideoSource
+    try:
+        source = VideoSource(input_video_path)
+    except IOError as e:
+        print(f"❌ 错误：{e}")
         return
-        
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v') # 或者用 'avc1'
-    out = cv2.VideoWriter(str(output_video_path), fourcc, fps, (width, height))
+    print(f"视频信息: {source.describe()}")
 
-    frame_count = 0
-    # 逐帧处理结果
-    for results in results_generator:
-        annotated_frame = results.plot() # 获取画好框的帧
-        out.write(annotated_frame) # 写入新的视频文件
-        frame_count += 1
-        # 打印进度 (例如每100帧)
-        if frame_count % 100 == 0:
-            print(f"   ... 已处理 {frame_count} 帧 ...")
-    
-    # 清理资源
-    cap.release()
-    out.release()
+    roi_detector = None
+    if ROI is not None:
+        # 只把ROI内的像素送入模型，框会被映射回整帧坐标
+        roi_detector = ROIDetector(model, roi=None if ROI == "auto" else ROI)
+        infer_fn = roi_detector
+
+    if not RENDER_VIDEO:
+        output_video_path = None
+        print("RENDER_VIDEO=False：不绘制、不写出视频")
+
+    detection_log = DetectionLogWriter(detections_path, names=model.names, fps=source.fps) if WRITE_DETECTIONS else None
+    try:
+        with source:
+            stats = run_video_pipeline(source, output_video_path, infer_fn,
+                                       batch_size=BATCH_SIZE, max_batch_latency=MAX_BATCH_LATENCY,
+                                       on_result=detection_log.add if detection_log is not None else None,
+                                       encoder=VIDEO_ENCODER)
+    finally:
+        if detection_log is not None:
+            detection_log.close()
+    frame_count = stats["frames"]
+    print_pipeline_stats(stats)
+    if roi_detector is not None:
+        print(roi_detector.describe())
 
     print(f"\n✅ 视频推理完成！ (共 {frame_count} 帧)")
-    print(f"结果已保存到文件: {output_video_path}")
+    if output_video_path is not None:
+        print(f"结果已保存到文件: {output_video_path}")
+    if detection_log is not None:
+        print(f"检测日志已保存到: {detections_path} （{detection_log.rows} 个框）")
 
 if __name__ == '__main__':
     main()
@@ -2,10 +2,12 @@ import json
 import os
 from pathlib import Path
 from tqdm import tqdm
+from image_size_cache import ImageSizeCache, default_cache_path
 
-def convert_bdd_json_to_yolo(json_path: Path):
+def convert_bdd_json_to_yolo(json_path: Path, size_cache: ImageSizeCache = None):
     """
     读取单个BDD100K的.json文件，将其内容转换为YOLO格式的字符串。
+    传入 size_cache 时通过尺寸缓存获取图片宽高，不再打开图片。
     """
     with open(json_path) as f:
         data = json.load(f)
@@ -28,11 +30,14 @@ def convert_bdd_json_to_yolo(json_path: Path):
     # 从JSON中获取图片尺寸
     # BDD100K v1的JSON格式没有直接提供图片尺寸，我们需要从图片本身获取
     # 为了简化，我们假设图片和标签文件名一一对应，并且图片在../images/目录下
+    img_path = json_path.parent.parent.parent / "images" / json_path.parent.name / f"{json_path.stem}.jpg"
     try:
-        from PIL import Image
-        img_path = json_path.parent.parent.parent / "images" / json_path.parent.name / f"{json_path.stem}.jpg"
-        with Image.open(img_path) as img:
-            img_width, img_height = img.size
+        if size_cache is not None:
+            img_width, img_height = size_cache.get(img_path)
+        else:
+            from PIL import Image
+            with Image.open(img_path) as img:
+                img_width, img_height = img.size
     except Exception as e:
         print(f"警告：无法找到或打开图片 {img_path} 来获取尺寸，跳过 {json_path.name}。错误: {e}")
         return None
@@ -73,6 +78,7 @@ def main():
     print("--- 开始将 BDD100K 的 .json 标签转换为 YOLO .txt 格式 ---")
     project_root = Path(__file__).parent.parent
     labels_base_path = project_root / "data" / "raw" / "bdd100k" / "labels"
+    size_cache = ImageSizeCache(default_cache_path(project_root))
 
     # 我们要处理 'train' 和 'val' 两个集合
     for split in ["train", "val"]:
@@ -90,14 +96,16 @@ def main():
             continue
 
         for json_path in tqdm(json_files, desc=f"转换 {split} 标签"):
-            yolo_content = convert_bdd_json_to_yolo(json_path)
+            yolo_content = convert_bdd_json_to_yolo(json_path, size_cache)
             
             if yolo_content is not None:
                 # 在同一个文件夹下，创建一个同名的.txt文件
                 txt_path = json_path.with_suffix('.txt')
                 with open(txt_path, 'w') as f:
                     f.write(yolo_content)
-                    
+
+        size_cache.save()
+
     print("\n✅ 所有 .json 文件已成功转换为 .txt 格式！")
 
 if __name__ == '__main__':
@@ -1,71 +1,348 @@
 import json
 import os
+import re
+import time
+from multiprocessing import Pool
 from pathlib import Path
 from tqdm import tqdm
-from PIL import Image
+from image_size_cache import BDD100K_IMAGE_SIZE, ImageSizeCache, default_cache_path
+from label_manifest import MANIFEST_FILENAME, LabelManifest, category_map_version, file_sha1
+from yolo_box_ops import format_yolo_lines, xyxy_to_yolo, xyxy_to_yolo_batch
+from packed_labels import NAMES_FILENAME, PackedLabelStore, PackedLabelWriter, to_rows, update_packed_store
+
+# 【【【关键修正 1：修正了类别名称】】】
+# BDD100K的官方名称是 'motor' 和 'bike'
+CATEGORY_MAP = {
+    'person': 0,       # 将 'person' 映射为 行人
+    'pedestrian': 0,   # 将 'pedestrian' 也映射为 行人
+    'rider': 1,
+    'car': 2,
+    'truck': 3,
+    'bus': 4,
+    'train': 5,
+    'motor': 6,        # 修正：'motorcycle' -> 'motor'
+    'bike': 7,         # 修正：'bicycle' -> 'bike'
+    'traffic light': 8,
+    'traffic sign': 9
+}
+
+# 类别映射的版本号，写入增量转换清单；映射一旦修改，所有标签都会重新转换
+CATEGORY_MAP_VERSION = category_map_version(CATEGORY_MAP)
+# 流式转换合并标签文件时，每攒够这么多帧就一起做一次归一化和格式化
+CONSOLIDATED_BATCH_FRAMES = 1024
+# 流式读取时单个数组元素（一帧的标注）允许的最大字符数，超过则认为文件已损坏，避免缓冲区无限增长
+MAX_FRAME_CHARS = 64 << 20
+# 数组元素之后的空白和分隔符
+_SEPARATOR_RE = re.compile(r'[ \t\r\n]*[,\]]')
+
+def objects_to_boxes(objects):
+    """
+    从一帧的BDD100K标注对象列表中取出我们关心的类别，返回 (类别ID列表, 像素xyxy框列表)。
+    单文件格式（frames[0].objects）和合并大文件格式（labels）的对象结构相同，共用这一段逻辑。
+    """
+    class_ids = []
+    boxes = []
+
+    for label in objects:
+        category = label.get('category')
+
+        # 【【【关键修正 2：使用 .get() 来安全处理】】】
+        class_id = CATEGORY_MAP.get(category)
+
+        # 只有当类别在我们关心的地图中时才处理
+        if class_id is not None and 'box2d' in label:
+            box = label['box2d']
+            class_ids.append(class_id)
+            boxes.append((box['x1'], box['y1'], box['x2'], box['y2']))
+
+    return class_ids, boxes
+
+def objects_to_arrays(objects, img_width: int, img_height: int):
+    """
+    把一帧中的BDD100K标注对象列表转换为 (类别ID数组, 归一化框数组)。
+    用 yolo_box_ops 一次性完成归一化、裁剪和退化框过滤；批量转换很多帧时用 xyxy_to_yolo_batch。
+    """
+    class_ids, xywhn, _ = xyxy_to_yolo(*objects_to_boxes(objects), img_width, img_height)
+    return class_ids, xywhn
+
+def bdd_json_to_boxes(json_path: Path):
+    """读取单个BDD100K的.json文件，返回 (类别ID列表, 像素xyxy框列表)。"""
+    with open(json_path) as f:
+        data = json.load(f)
+
+    objects = data['frames'][0].get('objects', []) if data.get('frames') else []
+    return objects_to_boxes(objects)
+
+def bdd_json_to_arrays(json_path: Path, img_width: int, img_height: int):
+    """读取单个BDD100K的.json文件，返回 (类别ID数组, 归一化框数组)。"""
+    class_ids, xywhn, _ = xyxy_to_yolo(*bdd_json_to_boxes(json_path), img_width, img_height)
+    return class_ids, xywhn
 
 def convert_bdd_json_to_yolo(json_path: Path, img_width: int, img_height: int) -> str:
     """
     读取单个BDD100K的.json文件，将其内容转换为YOLO格式的字符串。
     【【【V3 修正版】】】
     """
-    with open(json_path) as f:
-        data = json.load(f)
+    return format_yolo_lines(*bdd_json_to_arrays(json_path, img_width, img_height))
+
+def iter_consolidated_frames(json_path: Path, chunk_size: int = 1 << 20, max_frame_chars: int = MAX_FRAME_CHARS):
+    """
+    流式读取BDD100K官方的合并标签文件（例如 bdd100k_labels_images_train.json），逐帧产出字典。
+    该文件是一个巨大的顶层数组，这里每次只读入 chunk_size 个字符，
+    用 JSONDecoder.raw_decode 逐个解析数组元素，内存占用只和单帧的大小有关。
+    元素之间必须是 ',' 分隔、以 ']' 结尾，否则抛出 ValueError；单个元素超过 max_frame_chars 个字符也视为文件损坏。
+    """
+    decoder = json.JSONDecoder()
+    with open(json_path, encoding='utf-8') as f:
+        buffer, pos, eof = '', 0, False
+
+        def read_more():
+            # 丢掉已经解析过的部分，再读入一块
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
 
-    # 【【【关键修正 1：修正了类别名称】】】
-    # BDD100K的官方名称是 'motor' 和 'bike'
-    category_map = {
-        'person': 0,       # 将 'person' 映射为 行人
-        'pedestrian': 0,   # 将 'pedestrian' 也映射为 行人
-        'rider': 1,
-        'car': 2,
-        'truck': 3,
-        'bus': 4,
-        'train': 5,
-        'motor': 6,        # 修正：'motorcycle' -> 'motor'
-        'bike': 7,         # 修正：'bicycle' -> 'bike'
-        'traffic light': 8,
-        'traffic sign': 9
-    }
-
-    yolo_annotations = []
-
-    if 'frames' in data and data['frames']:
-        for label in data['frames'][0].get('objects', []):
-            category = label.get('category')
-
-            # 【【【关键修正 2：使用 .get() 来安全处理】】】
-            class_id = category_map.get(category)
-
-            # 只有当类别在我们关心的地图中时才处理
-            if class_id is not None and 'box2d' in label:
-                box = label['box2d']
-                x1, y1, x2, y2 = box['x1'], box['y1'], box['x2'], box['y2']
-
-                x_center = (x1 + x2) / 2.0
-                y_center = (y1 + y2) / 2.0
-                width = x2 - x1
-                height = y2 - y1
-
-                x_center_norm = x_center / img_width
-                y_center_norm = y_center / img_height
-                width_norm = width / img_width
-                height_norm = height / img_height
-
-                yolo_annotations.append(f"{class_id} {x_center_norm:.6f} {y_center_norm:.6f} {width_norm:.6f} {height_norm:.6f}")
-
-    return "\n".join(yolo_annotations)
+        def peek():
+            # 跳过空白（可能跨越好几块），返回下一个字符但不消耗它；文件结束时返回空字符串
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer[pos:pos + 1]
+                read_more()
+
+        if peek() != '[':
+            raise ValueError(f"{json_path} 不是一个JSON数组，无法流式读取。")
+        pos += 1
+        if peek() == ']':
+            return
+
+        index = 0
+        while True:
+            if peek() in ('', ',', ']'):
+                raise ValueError(f"{json_path} 第 {index + 1} 个元素缺失或文件意外结束。")
+            while True:
+                try:
+                    frame, end = decoder.raw_decode(buffer, pos)
+                    # 元素后面已经读到分隔符才算完整：否则它可能被块的边界截断了
+                    # （例如 12345 只读到了 12，-500.0 只读到了 -500.），读入下一块再解析
+                    if eof or _SEPARATOR_RE.match(buffer, end):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                if len(buffer) - pos > max_frame_chars:
+                    raise ValueError(f"{json_path} 第 {index + 1} 个元素超过 {max_frame_chars} 个字符，文件可能已损坏。")
+                read_more()
+
+            yield frame
+            pos = end
+            index += 1
+            separator = peek()
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"{json_path} 第 {index} 个元素之后应为 ',' 或 ']'，实际为 {separator!r}。")
+            pos += 1
+
+def convert_consolidated_json(json_path: Path, output_dir: Path, available_images, img_size,
+                              write_txt: bool = True, packed_writer: PackedLabelWriter = None) -> int:
+    """
+    流式转换合并标签文件：每攒够 CONSOLIDATED_BATCH_FRAMES 帧就一起转换并写出对应的 .txt，返回转换的帧数。
+    只转换 available_images 中存在图片的帧；传入 packed_writer 时同时追加到打包标签中。
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = 0
+    start_time = time.perf_counter()
+    pending_names, pending_boxes = [], []
+
+    def flush():
+        texts, arrays = xyxy_to_yolo_batch(pending_boxes, [img_size] * len(pending_boxes))
+        for base_name, text, (class_ids, xywhn) in zip(pending_names, texts, arrays):
+            if write_txt:
+                with open(output_dir / f"{base_name}.txt", 'w') as f:
+                    f.write(text)
+            if packed_writer is not None:
+                packed_writer.add(base_name, to_rows(class_ids, xywhn))
+        pending_names.clear()
+        pending_boxes.clear()
+
+    for frame in tqdm(iter_consolidated_frames(json_path), desc=f"流式转换 {json_path.name}"):
+        base_name = Path(frame.get('name', '')).stem
+        if base_name not in available_images:
+            continue
+        pending_names.append(base_name)
+        pending_boxes.append(objects_to_boxes(frame.get('labels') or []))
+        written += 1
+        if len(pending_names) >= CONSOLIDATED_BATCH_FRAMES:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - start_time
+    rate = written / elapsed if elapsed > 0 else 0.0
+    print(f"已从 {json_path.name} 转换 {written} 帧标签，用时 {elapsed:.1f} 秒 ({rate:.0f} 文件/秒)")
+    return written
+
+def convert_file_batch(tasks):
+    """
+    转换一批标签文件的工作单元（可在子进程中运行）。
+    每个 task 为 (json_path, (img_width, img_height), write_txt)，返回 [(json_path, 错误信息或None, 标签数组)]。
+    图片尺寸由主进程通过尺寸缓存查好后传入，子进程不再打开图片。
+    先逐个读取JSON，再用 xyxy_to_yolo_batch 把整批的框一起归一化和格式化。
+    标签数组为 (n, 5) 的打包格式，供主进程写入打包标签。
+    """
+    results, loaded = [], []
+    for json_path, img_size, write_txt in tasks:
+        try:
+            loaded.append((json_path, img_size, write_txt, bdd_json_to_boxes(json_path)))
+        except Exception as e:
+            results.append((json_path, str(e), None))
+
+    texts, arrays = xyxy_to_yolo_batch([boxes for *_, boxes in loaded], [img_size for _, img_size, _, _ in loaded])
+    for (json_path, _, write_txt, _), text, (class_ids, xywhn) in zip(loaded, texts, arrays):
+        try:
+            if write_txt:
+                # 即使没有框（图片中没有我们关心的类别），也要创建一个空的.txt文件
+                # 这对YOLOv8的训练很重要（作为负样本）
+                with open(json_path.with_suffix('.txt'), 'w') as f:
+                    f.write(text)
+            results.append((json_path, None, to_rows(class_ids, xywhn)))
+        except Exception as e:
+            results.append((json_path, str(e), None))
+    return results
+
+def convert_split(tasks, num_workers: int = 1, chunksize: int = 64, desc: str = "转换标签", on_converted=None) -> int:
+    """
+    转换一个集合中的所有标签文件，返回成功转换的文件数。
+    任务按 chunksize 分批，每批由 convert_file_batch 一起转换；num_workers > 1 时各批交给进程池，结果以流的方式逐批返回。
+    on_converted 不为空时，每转换成功一个文件就以 (json_path, 标签数组) 调用一次。
+    """
+    start_time = time.perf_counter()
+    batches = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+    if num_workers > 1:
+        pool = Pool(processes=num_workers)
+        results = pool.imap_unordered(convert_file_batch, batches)
+    else:
+        pool = None
+        results = map(convert_file_batch, batches)
+
+    converted = 0
+    try:
+        with tqdm(total=len(tasks), desc=desc) as progress:
+            for batch_results in results:
+                for json_path, error, rows in batch_results:
+                    if error is None:
+                        converted += 1
+                        if on_converted is not None:
+                            on_converted(json_path, rows)
+                    else:
+                        print(f"\n错误：处理文件 {json_path.name} 时发生意外错误: {error}")
+                progress.update(len(batch_results))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start_time
+    rate = converted / elapsed if elapsed > 0 else 0.0
+    print(f"已转换 {converted}/{len(tasks)} 个文件，用时 {elapsed:.1f} 秒 ({rate:.0f} 文件/秒，{num_workers} 个进程)")
+    return converted
+
+def convert_json_dir(json_dir: Path, image_dir: Path, available_images, size_cache: ImageSizeCache, packed_dir: Path,
+                     write_txt: bool = True, write_packed: bool = True, incremental: bool = True,
+                     num_workers: int = 1, chunksize: int = 64, desc: str = "转换标签") -> bool:
+    """
+    转换一个集合的标签目录（每张图片一个 .json），只转换 available_images 中存在图片的标签。
+    incremental 为 True 时按清单只转换新增或修改过的文件；write_packed 为 True 时同步更新 packed_dir 的打包标签。
+    标签目录不存在时返回 False。
+    """
+    if not json_dir.exists():
+        print(f"警告：标签目录 {json_dir} 未找到，跳过。")
+        return False
+
+    json_files = [p for p in json_dir.glob("*.json") if p.stem in available_images]
+    all_stems = {p.stem for p in json_files}
+
+    if incremental:
+        manifest = LabelManifest(json_dir / MANIFEST_FILENAME, CATEGORY_MAP_VERSION)
+        # 只写打包标签时没有 .txt 可检查，以打包目录是否存在作为输出是否存在的依据
+        outputs_exist = None if write_txt else packed_dir.exists()
+        digests, unchanged, stale_outputs = manifest.plan(json_files, json_dir, outputs_exist=outputs_exist)
+        for txt_path in stale_outputs:
+            txt_path.unlink()
+        print(f"增量模式：{len(digests)} 个需要转换，{unchanged} 个未变化，删除 {len(stale_outputs)} 个过期的 .txt。")
+        if write_packed:
+            # 清单只记录 .txt 是否最新：之前没有写打包标签（或打包标签不完整）时，
+            # 打包标签里缺少的图片即使 .json 没变也要重新转换，否则它们会从打包标签中丢失
+            packed_names = set(PackedLabelStore(packed_dir).names) if (packed_dir / NAMES_FILENAME).exists() else set()
+            missing = [p for p in json_files if p.stem not in packed_names and p not in digests]
+            for json_path in missing:
+                digests[json_path] = file_sha1(json_path)
+            if missing:
+                print(f"打包标签中缺少 {len(missing)} 张图片，重新转换。")
+        json_files = list(digests)
+    else:
+        manifest = None
+        digests = {}
+
+    packed_updates = {}
+
+    def on_converted(json_path, rows):
+        if manifest is not None:
+            manifest.record(json_path, digests[json_path])
+        if write_packed:
+            packed_updates[json_path.stem] = rows
+
+    if json_files:
+        tasks = [
+            (json_path, size_cache.get(image_dir / f"{json_path.stem}.jpg"), write_txt)
+            for json_path in json_files
+        ]
+        size_cache.save()
+        convert_split(tasks, num_workers=num_workers, chunksize=chunksize, desc=desc, on_converted=on_converted)
+
+    if write_packed:
+        packed_stale = (not (packed_dir / NAMES_FILENAME).exists()
+                        or set(PackedLabelStore(packed_dir).names) != all_stems)
+        if packed_updates or packed_stale:
+            # 未变化的图片沿用旧的打包数据，只有新转换的图片使用新标签
+            num_images = update_packed_store(packed_dir, packed_updates, all_stems)
+            print(f"打包标签已更新: {packed_dir} ({num_images} 张图片)")
+
+    if manifest is not None:
+        manifest.save()
+    return True
 
 def main():
     """
     主函数，遍历所有.json文件并进行转换。
     """
+    # 并行进程数（设为1则退回单进程串行转换）
+    NUM_WORKERS = os.cpu_count() or 1
+    # 每批的文件数：一批文件的框一起转换，同时也是每个进程一次领取的任务量，太小会增加进程间通信开销
+    CHUNK_SIZE = 64
+    # BDD100K 的帧都是 1280x720，开启后完全不读取图片；关闭则通过尺寸缓存读取文件头
+    ASSUME_BDD100K_SIZE = True
+    # 增量模式：只转换新增或修改过的 .json，并删除源文件已不存在的 .txt
+    INCREMENTAL = True
+    # 是否写出每张图片一个的 .txt（Ultralytics训练需要）；
+    # 是否额外写出打包标签 labels/<split>.packed（一个可内存映射的数组 + 偏移索引）
+    WRITE_TXT = True
+    WRITE_PACKED = True
+
     print("--- 开始将 BDD100K 的 .json 标签转换为 YOLO .txt 格式 (V3 最终修正版) ---")
     project_root = Path(__file__).parent.parent
     data_base_path = project_root / "data" / "raw" / "bdd100k"
     images_base_path = data_base_path / "images"
     labels_base_path = data_base_path / "labels"
 
+    size_cache = ImageSizeCache(
+        default_cache_path(project_root),
+        fixed_size=BDD100K_IMAGE_SIZE if ASSUME_BDD100K_SIZE else None
+    )
+
     for split in ["train", "val"]:
         print(f"\n正在处理 {split} 集合...")
 
@@ -78,32 +355,23 @@ def main():
         print(f"在 {split} 集合中找到了 {len(available_images)} 张可用的图片。")
 
         json_dir = labels_base_path / split
-        if not json_dir.exists():
-            print(f"警告：标签目录 {json_dir} 未找到，跳过。")
-            continue
+        packed_dir = labels_base_path / f"{split}.packed"
 
-        json_files = list(json_dir.glob("*.json"))
-
-        for json_path in tqdm(json_files, desc=f"转换 {split} 标签"):
-            base_name = json_path.stem
+        # 如果存在官方的合并标签大文件，就用流式模式直接从大文件生成每张图片的 .txt
+        consolidated_path = labels_base_path / f"bdd100k_labels_images_{split}.json"
+        if consolidated_path.exists():
+            print(f"发现合并标签文件 {consolidated_path.name}，使用流式模式转换。")
+            packed_writer = PackedLabelWriter(packed_dir) if WRITE_PACKED else None
+            # 合并文件不带尺寸信息，这里统一使用BDD100K的固定尺寸
+            convert_consolidated_json(consolidated_path, json_dir, available_images, BDD100K_IMAGE_SIZE,
+                                      write_txt=WRITE_TXT, packed_writer=packed_writer)
+            if packed_writer is not None:
+                print(f"打包标签已写入: {packed_dir} ({packed_writer.close()} 张图片)")
+            continue
 
-            if base_name in available_images:
-                try:
-                    img_path = image_dir / f"{base_name}.jpg"
-                    with Image.open(img_path) as img:
-                        img_width, img_height = img.size
-
-                    yolo_content = convert_bdd_json_to_yolo(json_path, img_width, img_height)
-
-                    # 即使yolo_content为空（图片中没有我们关心的类别），也要创建一个空的.txt文件
-                    # 这对YOLOv8的训练很重要（作为负样本）
-                    txt_path = json_path.with_suffix('.txt')
-                    with open(txt_path, 'w') as f:
-                        f.write(yolo_content)
-                except Exception as e:
-                    print(f"\n错误：处理文件 {json_path.name} 时发生意外错误: {e}")
-            else:
-                pass
+        convert_json_dir(json_dir, image_dir, available_images, size_cache, packed_dir,
+                         write_txt=WRITE_TXT, write_packed=WRITE_PACKED, incremental=INCREMENTAL,
+                         num_workers=NUM_WORKERS, chunksize=CHUNK_SIZE, desc=f"转换 {split} 标签")
 
     print("\n✅ V3 最终版 .txt 文件已生成完毕！")
 
@@ -2,7 +2,7 @@ import json
 import os
 from pathlib import Path
 from tqdm import tqdm
-from PIL import Image
+from image_size_cache import ImageSizeCache, default_cache_path
 
 def convert_bdd_json_to_yolo(json_path: Path, img_width: int, img_height: int) -> str:
     """
@@ -51,6 +51,9 @@ def main():
     images_base_path = data_base_path / "images"
     labels_base_path = data_base_path / "labels"
 
+    # 图片尺寸只在第一次运行时读取文件头，之后直接从缓存中取
+    size_cache = ImageSizeCache(default_cache_path(project_root))
+
     for split in ["train", "val"]:
         print(f"\n正在处理 {split} 集合...")
         
@@ -79,8 +82,7 @@ def main():
             if base_name in available_images:
                 try:
                     img_path = image_dir / f"{base_name}.jpg"
-                    with Image.open(img_path) as img:
-                        img_width, img_height = img.size
+                    img_width, img_height = size_cache.get(img_path)
 
                     yolo_content = convert_bdd_json_to_yolo(json_path, img_width, img_height)
                     
@@ -94,6 +96,8 @@ def main():
                 # 这是一个正常情况，我们可以选择不打印，以免刷屏
                 pass
 
+        size_cache.save()
+
     print("\n✅ 所有有效的 .json 文件已成功转换为 .txt 格式！")
 
 if __name__ == '__main__':
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_FILENAME = ".yolo_manifest.json"
+MANIFEST_FORMAT = 1
+
+
+def file_sha1(path: Path) -> str:
+    """计算文件内容的SHA1。"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def category_map_version(category_map: dict) -> str:
+    """类别映射的版本号：映射有任何改动都会得到不同的值，从而触发全量重新转换。"""
+    payload = json.dumps(category_map, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+class LabelManifest:
+    """
+    记录每个源标注文件（.json）上次转换时的 mtime、大小和内容哈希，以及当时使用的类别映射版本。
+    增量转换时只有新增或内容变化的标注才会被重新转换，源文件已删除的 .txt 会被清理。
+    """
+
+    def __init__(self, manifest_path: Path, map_version: str):
+        self.manifest_path = Path(manifest_path)
+        self.map_version = map_version
+        self.files = {}
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path) as f:
+                    data = json.load(f)
+                if data.get("format") == MANIFEST_FORMAT and data.get("category_map_version") == map_version:
+                    self.files = data.get("files", {})
+                else:
+                    print("类别映射或清单格式已变化，所有标注都将重新转换。")
+            except (OSError, ValueError) as e:
+                print(f"警告：清单 {self.manifest_path} 无法读取，将全量转换。错误: {e}")
+
+    def plan(self, json_paths, label_dir: Path, output_suffix: str = '.txt', outputs_exist: bool = None):
+        """
+        比较当前的源文件和清单，返回 (需要转换的 {json_path: sha1}, 未变化的数量, 过期的输出文件列表)。
+        mtime/大小一致时直接视为未变化；不一致时再比较内容哈希，避免 touch 之类的操作触发重复转换。
+        outputs_exist 为空时逐个检查对应的输出文件是否存在；不写逐文件输出时由调用方直接给出。
+        """
+        to_convert = {}
+        unchanged = 0
+        current_names = set()
+
+        for json_path in json_paths:
+            current_names.add(json_path.name)
+            stat = json_path.stat()
+            entry = self.files.get(json_path.name)
+            has_output = json_path.with_suffix(output_suffix).exists() if outputs_exist is None else outputs_exist
+
+            if entry is not None and has_output:
+                if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    unchanged += 1
+                    continue
+                digest = file_sha1(json_path)
+                if digest == entry["sha1"]:
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    entry["size"] = stat.st_size
+                    unchanged += 1
+                    continue
+            else:
+                digest = file_sha1(json_path)
+            to_convert[json_path] = digest
+
+        # 清单中已经不存在（源文件被删除或图片缺失）的条目，对应的输出都是过期的
+        stale_outputs = []
+        for name in list(self.files):
+            if name not in current_names:
+                del self.files[name]
+        current_stems = {Path(name).stem for name in current_names}
+        for output_path in Path(label_dir).glob(f"*{output_suffix}"):
+            if output_path.stem not in current_stems:
+                stale_outputs.append(output_path)
+
+        return to_convert, unchanged, stale_outputs
+
+    def record(self, json_path: Path, digest: str):
+        """记录一个转换成功的源文件。"""
+        stat = json_path.stat()
+        self.files[json_path.name] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": digest}
+
+    def save(self):
+        """写回清单（先写临时文件再替换）。"""
+        data = {"format": MANIFEST_FORMAT, "category_map_version": self.map_version, "files": self.files}
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.manifest_path)
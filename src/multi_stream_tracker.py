@@ -0,0 +1,186 @@
+import os
+import time
+from multiprocessing import Pool
+from pathlib import Path
+import torch
+from ultralytics import YOLO
+from fast_renderer import FastRenderer
+from tracking import TRACK_CONF, create_tracker, update_tracker
+from video_encoders import create_encoder
+from video_source import VideoSource
+
+# 每个工作进程各自加载一次的模型
+_MODEL = None
+
+VIDEO_SUFFIXES = {'.mp4', '.mov', '.avi', '.mkv'}
+
+
+def _init_worker(model_path: str, torch_threads: int):
+    """工作进程初始化：限制每个进程的线程数，避免多个进程抢占同一批CPU核心，然后加载一次模型。"""
+    global _MODEL
+    torch.set_num_threads(torch_threads)
+    _MODEL = YOLO(model_path)
+
+
+class StreamState:
+    """一路视频的全部状态：输入、输出、独立的追踪器和计时。不同视频之间不共享任何追踪状态。"""
+
+    def __init__(self, input_path: Path, output_path: Path, tracker_yaml: str, encoder: str = "opencv"):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.source = VideoSource(input_path)
+        self.writer = create_encoder(encoder, output_path, self.source.fps, self.source.size)
+        self.tracker = create_tracker(self.source.fps, tracker_yaml)
+        self.renderer = FastRenderer()
+        self.frames = 0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def close(self):
+        self.end_time = time.perf_counter()
+        self.source.release()
+        self.writer.close()
+
+    def summary(self) -> dict:
+        seconds = (self.end_time or time.perf_counter()) - self.start_time
+        return {
+            "stream": self.input_path.name,
+            "frames": self.frames,
+            "seconds": seconds,
+            "fps": self.frames / seconds if seconds > 0 else 0.0,
+        }
+
+
+def process_stream_group(task) -> list:
+    """
+    在一个工作进程中同时处理一组视频。
+    公平调度：每一轮从每路仍未结束的视频中各取一帧，合成一个batch送入共享的模型，
+    再把每帧的检测结果交给该路视频自己的追踪器。每路视频每轮都前进一帧，不会有视频被“饿死”。
+    """
+    streams, tracker_yaml, encoder = task
+    states = []
+    for input_path, output_path in streams:
+        try:
+            states.append(StreamState(Path(input_path), Path(output_path), tracker_yaml, encoder))
+        except IOError as e:
+            print(f"❌ 错误：{e}")
+
+    active = list(states)
+    try:
+        while active:
+            frames, owners = [], []
+            for state in active:
+                ok, frame = state.source.read()
+                if ok:
+                    frames.append(frame)
+                    owners.append(state)
+                else:
+                    state.close()
+            active = owners
+            if not frames:
+                break
+
+            # conf 与 model.track 一致，ByteTrack 的第二轮关联需要低分检测
+            batch_results = _MODEL.predict(frames, conf=TRACK_CONF, verbose=False)
+            for state, results in zip(owners, batch_results):
+                results = update_tracker(state.tracker, results)
+                state.writer.write(state.renderer(results))
+                state.frames += 1
+    finally:
+        # 出错时也要关闭每一路视频的输入和输出，已经写出的部分视频才能正常播放
+        for state in states:
+            if state.end_time is None:
+                try:
+                    state.close()
+                except Exception as e:
+                    print(f"❌ 错误：关闭 {state.output_path} 失败：{e}")
+    return [state.summary() for state in states]
+
+
+def assign_streams(videos, num_workers: int):
+    """
+    按视频长度做负载均衡：从最长的视频开始，依次分给当前总帧数最少的工作进程（LPT调度）。
+    返回每个工作进程负责的视频列表（空组会被去掉）。
+    """
+    lengths = {}
+    for video in videos:
+        try:
+            with VideoSource(video) as source:
+                lengths[video] = max(source.frame_count, 1)
+        except IOError as e:
+            print(f"❌ 错误：{e}")
+
+    groups = [[] for _ in range(num_workers)]
+    loads = [0] * num_workers
+    for video in sorted(lengths, key=lengths.get, reverse=True):
+        i = loads.index(min(loads))
+        groups[i].append(video)
+        loads[i] += lengths[video]
+    return [g for g in groups if g]
+
+
+def run_multi_stream(videos, output_dir: Path, model_path: Path, num_workers: int,
+                     tracker_yaml: str = 'bytetrack.yaml', encoder: str = "opencv") -> dict:
+    """把多路视频分配到多个工作进程上并发追踪，返回每路视频和整体的吞吐统计。"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    groups = assign_streams(videos, num_workers)
+    if not groups:
+        return {"streams": [], "total_frames": 0, "wall_seconds": 0.0, "aggregate_fps": 0.0}
+
+    tasks = [
+        ([(str(v), str(output_dir / f"{Path(v).stem}_tracked.mp4")) for v in group], tracker_yaml, encoder)
+        for group in groups
+    ]
+    torch_threads = max(1, (os.cpu_count() or 1) // len(groups))
+
+    start = time.perf_counter()
+    with Pool(processes=len(groups), initializer=_init_worker, initargs=(str(model_path), torch_threads)) as pool:
+        summaries = [s for group_summary in pool.imap_unordered(process_stream_group, tasks) for s in group_summary]
+    wall_seconds = time.perf_counter() - start
+
+    total_frames = sum(s["frames"] for s in summaries)
+    return {
+        "streams": summaries,
+        "total_frames": total_frames,
+        "wall_seconds": wall_seconds,
+        "aggregate_fps": total_frames / wall_seconds if wall_seconds > 0 else 0.0,
+    }
+
+
+def main():
+    """
+    主函数，使用BDD100K模型对一个目录下的所有视频进行并发追踪。
+    """
+    # 工作进程数：每个进程加载一份模型，并负责若干路视频
+    NUM_WORKERS = max(1, min(4, os.cpu_count() or 1))
+    # 写视频的编码器（见 video_encoders.create_encoder）
+    VIDEO_ENCODER = "auto"
+
+    print("--- 开始多路视频并发追踪 ---")
+    project_root = Path(__file__).parent.parent
+
+    model_path = project_root / "runs/detect/yolov8m_bdd100k_FIXED_v15/weights/best.pt" # 请确保这是您正确的模型路径！
+    # 把所有要处理的摄像头片段放在这个目录下
+    input_dir = project_root / "data/raw/streams"
+    output_dir = project_root / "results/multi_stream"
+
+    if not model_path.exists():
+        print(f"❌ 错误：找不到模型文件: {model_path}")
+        return
+    if not input_dir.exists():
+        print(f"❌ 错误：找不到视频目录: {input_dir}")
+        return
+
+    videos = sorted(p for p in input_dir.iterdir() if p.suffix.lower() in VIDEO_SUFFIXES)
+    print(f"找到 {len(videos)} 路视频，使用 {NUM_WORKERS} 个工作进程。")
+
+    stats = run_multi_stream(videos, output_dir, model_path, NUM_WORKERS, encoder=VIDEO_ENCODER)
+
+    print("\n各路视频：")
+    for s in sorted(stats["streams"], key=lambda s: s["stream"]):
+        print(f"  - {s['stream']}: {s['frames']} 帧，{s['fps']:.1f} FPS")
+    print(f"\n总计 {stats['total_frames']} 帧，用时 {stats['wall_seconds']:.1f} 秒，整体吞吐 {stats['aggregate_fps']:.1f} FPS")
+    print(f"\n✅ 多路视频追踪完成！结果已保存到: {output_dir}")
+
+if __name__ == '__main__':
+    main()
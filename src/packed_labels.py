@@ -0,0 +1,139 @@
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from yolo_box_ops import format_yolo_lines
+
+# 打包格式：一个目录中包含三个文件
+#   boxes.npy   - float64 数组，形状 (框总数, 5)，每行为 [类别ID, xc, yc, w, h]（与YOLO .txt 相同）
+#   offsets.npy - int64 数组，形状 (图片数 + 1)，第 i 张图片的框为 boxes[offsets[i]:offsets[i+1]]
+#   names.txt   - 每行一个图片名（不含扩展名），顺序与 offsets 对应
+#   使用 float64 是为了导出回 .txt 时与直接转换的结果逐字一致
+BOXES_FILENAME = "boxes.npy"
+OFFSETS_FILENAME = "offsets.npy"
+NAMES_FILENAME = "names.txt"
+
+
+def parse_yolo_txt(txt_path: Path) -> np.ndarray:
+    """读取一个YOLO .txt 标签文件，返回 (n, 5) 的 float64 数组。"""
+    with open(txt_path) as f:
+        content = f.read()
+    rows = np.array(content.split(), dtype=np.float64)
+    return rows.reshape(-1, 5)
+
+
+def to_rows(class_ids, xywhn) -> np.ndarray:
+    """把 (类别ID, 归一化框) 合并成打包格式使用的 (n, 5) 数组。"""
+    rows = np.empty((len(class_ids), 5), dtype=np.float64)
+    rows[:, 0] = class_ids
+    rows[:, 1:] = np.asarray(xywhn).reshape(-1, 4)
+    return rows
+
+
+class PackedLabelWriter:
+    """
+    逐张图片追加标签，最后一次性写出打包文件。
+    先写到临时目录，全部成功后再替换目标目录，读者不会看到写了一半的数据。
+    """
+
+    def __init__(self, packed_dir: Path):
+        self.packed_dir = Path(packed_dir)
+        self.names = []
+        self.chunks = []
+        self.counts = []
+
+    def add(self, name: str, rows: np.ndarray):
+        """追加一张图片的标签（rows 为 (n, 5) 数组，可以为空）。"""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+        self.names.append(name)
+        self.chunks.append(rows)
+        self.counts.append(len(rows))
+
+    def close(self) -> int:
+        """写出打包文件，返回图片数。"""
+        boxes = np.concatenate(self.chunks) if self.chunks else np.empty((0, 5), dtype=np.float64)
+        offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+
+        tmp_dir = self.packed_dir.with_name(self.packed_dir.name + ".tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+        np.save(tmp_dir / BOXES_FILENAME, boxes)
+        np.save(tmp_dir / OFFSETS_FILENAME, offsets)
+        with open(tmp_dir / NAMES_FILENAME, 'w') as f:
+            f.write("\n".join(self.names))
+
+        if self.packed_dir.exists():
+            shutil.rmtree(self.packed_dir)
+        os.replace(tmp_dir, self.packed_dir)
+        return len(self.names)
+
+
+class PackedLabelStore:
+    """
+    打包标签的只读访问。boxes 以内存映射方式打开，store[name] 返回的是映射数组上的切片，
+    不会复制数据，也不会把整个文件读进内存。
+    """
+
+    def __init__(self, packed_dir: Path):
+        self.packed_dir = Path(packed_dir)
+        self.boxes = np.load(self.packed_dir / BOXES_FILENAME, mmap_mode='r')
+        self.offsets = np.load(self.packed_dir / OFFSETS_FILENAME)
+        with open(self.packed_dir / NAMES_FILENAME) as f:
+            content = f.read()
+        self.names = content.split("\n") if content else []
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name) -> np.ndarray:
+        i = self.index[name]
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def items(self):
+        """按存储顺序逐张产出 (图片名, 标签数组)。"""
+        for i, name in enumerate(self.names):
+            yield name, self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def image_index(self) -> np.ndarray:
+        """每个框所属图片的序号，便于对所有框做向量化统计。"""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.offsets))
+
+    def export_txt(self, output_dir: Path) -> int:
+        """导出回每张图片一个的YOLO .txt 文件（例如交给Ultralytics训练），返回写出的文件数。"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for name, rows in self.items():
+            with open(output_dir / f"{name}.txt", 'w') as f:
+                f.write(format_yolo_lines(rows[:, 0], rows[:, 1:]))
+        return len(self.names)
+
+
+def pack_label_dir(label_dir: Path, packed_dir: Path) -> int:
+    """把一个已有的YOLO .txt 标签目录打包，返回图片数。"""
+    writer = PackedLabelWriter(packed_dir)
+    for txt_path in sorted(Path(label_dir).glob("*.txt")):
+        writer.add(txt_path.stem, parse_yolo_txt(txt_path))
+    return writer.close()
+
+
+def update_packed_store(packed_dir: Path, updates: dict, keep_names) -> int:
+    """
+    增量更新打包标签：updates 中的图片使用新标签，其余 keep_names 中的图片沿用旧的打包数据，
+    不在 keep_names 中的图片被删除。返回更新后的图片数。
+    """
+    packed_dir = Path(packed_dir)
+    old_store = PackedLabelStore(packed_dir) if (packed_dir / NAMES_FILENAME).exists() else None
+    writer = PackedLabelWriter(packed_dir)
+    for name in sorted(keep_names):
+        if name in updates:
+            writer.add(name, updates[name])
+        elif old_store is not None and name in old_store:
+            writer.add(name, np.array(old_store[name]))
+    del old_store
+    return writer.close()
@@ -0,0 +1,132 @@
+import json
+import os
+from pathlib import Path
+import numpy as np
+from label_manifest import file_sha1
+
+# 缓存的检测使用很低的置信度阈值，之后任何更高的阈值都可以直接从缓存里筛出来
+CACHE_CONF = 0.001
+# 默认的NMS IoU，与 YOLO.val 的默认值一致（NMS IoU 是缓存键的一部分）
+CACHE_NMS_IOU = 0.7
+IMAGE_HASHES_FILENAME = "image_hashes.json"
+
+
+class ImageHashIndex:
+    """图片内容哈希的索引：(路径, mtime, 大小) 没变时直接复用上次算出的SHA1，不必重新读整张图片。"""
+
+    def __init__(self, index_path: Path):
+        self.index_path = Path(index_path)
+        self.entries = {}
+        self._dirty = False
+        if self.index_path.exists():
+            try:
+                with open(self.index_path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, image_path) -> str:
+        key = os.path.abspath(image_path)
+        st = os.stat(key)
+        entry = self.entries.get(key)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        digest = file_sha1(key)
+        self.entries[key] = [st.st_mtime_ns, st.st_size, digest]
+        self._dirty = True
+        return digest
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+
+class PredictionCache:
+    """
+    模型预测结果的缓存，键为 (权重文件SHA1, 图片SHA1, imgsz, NMS IoU)。
+    每个 (权重, imgsz, NMS IoU) 组合的所有检测打包在一个 .npz 里：
+      hashes (n,) 图片SHA1、shapes (n, 2) 原图 (高, 宽)、offsets (n+1,)、boxes (m, 6) = x1, y1, x2, y2, conf, cls。
+    检测以 CACHE_CONF 的低阈值保存，评估时可以按任意 conf 阈值和匹配IoU筛选，不需要再跑模型；
+    NMS 的 IoU 会改变保留下来的框，不能事后调整，所以不同的 nms_iou 使用各自的缓存文件
+    （要复现 YOLO.val(iou=...) 的结果，nms_iou 需要与 val 的 iou 参数相同）。
+    """
+
+    def __init__(self, cache_dir: Path, weights_path: Path, imgsz: int = 640, nms_iou: float = CACHE_NMS_IOU):
+        self.cache_dir = Path(cache_dir)
+        self.weights_path = Path(weights_path)
+        self.imgsz = imgsz
+        self.nms_iou = nms_iou
+        self.weights_sha1 = file_sha1(self.weights_path)
+        self.cache_path = self.cache_dir / f"{self.weights_sha1[:16]}_{imgsz}_nms{nms_iou:g}.npz"
+        self.hash_index = ImageHashIndex(self.cache_dir / IMAGE_HASHES_FILENAME)
+        self.entries = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.cache_path.exists():
+            return
+        with np.load(self.cache_path) as data:
+            if str(data["weights_sha1"]) != self.weights_sha1:
+                return
+            hashes, shapes, offsets, boxes = data["hashes"], data["shapes"], data["offsets"], data["boxes"]
+        for i, digest in enumerate(hashes):
+            self.entries[str(digest)] = (tuple(int(v) for v in shapes[i]), boxes[offsets[i]:offsets[i + 1]])
+
+    def save(self):
+        if not self._dirty:
+            self.hash_index.save()
+            return
+        hashes = list(self.entries)
+        shapes = np.array([self.entries[h][0] for h in hashes], dtype=np.int32).reshape(-1, 2)
+        chunks = [self.entries[h][1] for h in hashes]
+        offsets = np.zeros(len(hashes) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(c) for c in chunks])
+        boxes = np.concatenate(chunks).astype(np.float32) if chunks else np.zeros((0, 6), dtype=np.float32)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, weights_sha1=np.array(self.weights_sha1), hashes=np.array(hashes, dtype='U40'),
+                     shapes=shapes, offsets=offsets, boxes=boxes)
+        os.replace(tmp_path, self.cache_path)
+        self.hash_index.save()
+        self._dirty = False
+
+    def predict(self, model, image_paths, batch: int = 16, device=None) -> dict:
+        """
+        返回 {图片路径: (原图 (高, 宽), (n, 6) 检测数组)}。只对缓存里没有的图片运行模型。
+        """
+        image_paths = [str(p) for p in image_paths]
+        digests = {path: self.hash_index.get(path) for path in image_paths}
+        missing = [path for path in image_paths if digests[path] not in self.entries]
+        if missing:
+            print(f"   预测缓存：{len(image_paths) - len(missing)} 张命中，{len(missing)} 张需要推理")
+        for i in range(0, len(missing), batch):
+            chunk = missing[i:i + batch]
+            kwargs = {"imgsz": self.imgsz, "conf": CACHE_CONF, "iou": self.nms_iou, "verbose": False}
+            if device is not None:
+                kwargs["device"] = device
+            for path, results in zip(chunk, model.predict(chunk, **kwargs)):
+                self.entries[digests[path]] = (tuple(results.orig_shape),
+                                               results.boxes.data.cpu().numpy().astype(np.float32))
+            self._dirty = True
+        if missing:
+            self.save()
+        return {path: self.entries[digests[path]] for path in image_paths}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.save()
+
+
+def default_prediction_cache_dir(project_root: Path) -> Path:
+    return Path(project_root) / "data" / "cache" / "predictions"
@@ -1,43 +1,134 @@
+import fcntl
 import os
 import re
 import random
 import shutil
 from pathlib import Path
-from PIL import Image
 from tqdm import tqdm
+from image_size_cache import ImageSizeCache, default_cache_path
+from yolo_box_ops import format_yolo_lines, xyxy_to_yolo, xyxy_to_yolo_batch
+from packed_labels import PackedLabelWriter, to_rows
 
-def convert_pennfudan_txt_to_yolo(txt_file_path: Path, img_width: int, img_height: int) -> str:
-    """解析PennFudan的.txt标注文件并转换为YOLO格式的字符串。"""
+def pennfudan_txt_to_boxes(txt_file_path: Path):
+    """解析PennFudan的.txt标注文件，返回 (类别ID列表, 像素xyxy框列表)。"""
     with open(txt_file_path, 'r', encoding='latin-1') as f:
         content = f.read()
     
     pattern = r"Bounding box for object \d+ \"PASpersonWalking\" \(Xmin, Ymin\) - \(Xmax, Ymax\) : \((\d+), (\d+)\) - \((\d+), (\d+)\)"
     matches = re.findall(pattern, content)
     
-    yolo_annotations = []
-    for match in matches:
-        xmin, ymin, xmax, ymax = [int(coord) for coord in match]
-        class_id = 0  # 'pedestrian'
-        
-        # 转换为YOLO格式
-        x_center = (xmin + xmax) / 2.0
-        y_center = (ymin + ymax) / 2.0
-        width = xmax - xmin
-        height = ymax - ymin
-        
-        x_center_norm = x_center / img_width
-        y_center_norm = y_center / img_height
-        width_norm = width / img_width
-        height_norm = height / img_height
-        
-        yolo_annotations.append(f"{class_id} {x_center_norm:.6f} {y_center_norm:.6f} {width_norm:.6f} {height_norm:.6f}")
-        
-    return "\n".join(yolo_annotations)
+    boxes = [[int(coord) for coord in match] for match in matches]
+    class_ids = [0] * len(boxes)  # 'pedestrian'
+    return class_ids, boxes
+
+def pennfudan_txt_to_arrays(txt_file_path: Path, img_width: int, img_height: int):
+    """解析PennFudan的.txt标注文件，返回 (类别ID数组, 归一化框数组)。"""
+    # 所有框一次性完成归一化、裁剪和退化框过滤
+    class_ids, xywhn, _ = xyxy_to_yolo(*pennfudan_txt_to_boxes(txt_file_path), img_width, img_height)
+    return class_ids, xywhn
+
+def convert_pennfudan_txt_to_yolo(txt_file_path: Path, img_width: int, img_height: int) -> str:
+    """解析PennFudan的.txt标注文件并转换为YOLO格式的字符串。"""
+    return format_yolo_lines(*pennfudan_txt_to_arrays(txt_file_path, img_width, img_height))
+
+# Linux 上的 FICLONE ioctl（btrfs / xfs 等文件系统支持的写时复制克隆）
+FICLONE = 0x40049409
+
+def _reflink(src: Path, dst: Path):
+    """用写时复制的方式克隆文件，不支持时抛出 OSError。"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+
+def link_file(src: Path, dst: Path, mode: str = "auto") -> str:
+    """
+    把 src 物化到 dst，返回实际使用的方式。
+    mode="auto" 时依次尝试 硬链接 -> reflink -> 符号链接，全部失败才真正复制；
+    也可以指定 "hardlink" / "reflink" / "symlink" / "copy" 之一（失败时同样退回复制）。
+    """
+    attempts = {
+        "hardlink": lambda: os.link(src, dst),
+        "reflink": lambda: _reflink(src, dst),
+        "symlink": lambda: os.symlink(Path(src).resolve(), dst),
+    }
+    order = ["hardlink", "reflink", "symlink"] if mode == "auto" else [mode]
+    for method in order:
+        if method not in attempts:
+            break
+        try:
+            attempts[method]()
+            return method
+        except OSError:
+            continue
+    shutil.copy2(src, dst)
+    return "copy"
+
+def is_materialized(src: Path, dst: Path) -> bool:
+    """判断 dst 是否已经是 src 的最新副本（同一个inode、指向 src 的符号链接，或大小和修改时间都一致）。"""
+    if not os.path.lexists(dst):
+        return False
+    if dst.is_symlink():
+        return os.path.realpath(dst) == os.path.realpath(src)
+    src_stat, dst_stat = src.stat(), dst.stat()
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+def remove_entry(path):
+    """删除一个目录项：真实的子目录（例如旧目录结构留下的）整个删除，文件和符号链接直接删除。"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+def sync_directory(target_dir: Path, desired: dict, mode: str = "auto") -> dict:
+    """
+    让 target_dir 的内容和 desired（文件名 -> 源文件路径）完全一致：
+    多余的文件被删除，已经是最新的文件保持不动，只有新增或变化的文件才会重新链接。
+    返回各种操作的计数。
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    stats = {"unchanged": 0, "removed": 0}
+
+    for entry in os.scandir(target_dir):
+        if entry.name not in desired:
+            remove_entry(entry.path)
+            stats["removed"] += 1
+
+    for name, src in desired.items():
+        dst = target_dir / name
+        if is_materialized(src, dst):
+            stats["unchanged"] += 1
+            continue
+        if os.path.lexists(dst):
+            remove_entry(dst)
+        method = link_file(src, dst, mode)
+        stats[method] = stats.get(method, 0) + 1
+    return stats
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """只有内容变化时才写文件，返回是否写入。"""
+    if path.exists():
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
 
 def main():
     """
     主函数，执行数据集的准备、转换和划分。
     """
+    # 是否额外写出打包标签 labels/<split>.packed（一个可内存映射的数组 + 偏移索引）
+    WRITE_PACKED = True
+    # 图片物化方式："auto"（硬链接 -> reflink -> 符号链接 -> 复制）或 "hardlink" / "reflink" / "symlink" / "copy"
+    MATERIALIZE_MODE = "auto"
+
     print("--- 开始处理Penn-Fudan数据集 ---")
 
     # 定义路径
@@ -48,26 +139,13 @@ def main():
     raw_images_path = raw_data_path / "PNGImages"
     raw_labels_path = raw_data_path / "Annotation"
 
-    # 1. 清理并创建处理后的数据目录结构
-    if processed_data_path.exists():
-        print(f"清理旧的处理数据文件夹: {processed_data_path}")
-        shutil.rmtree(processed_data_path)
-    
-    print("创建新的处理数据目录结构...")
-    train_images_dir = processed_data_path / "images" / "train"
-    val_images_dir = processed_data_path / "images" / "val"
-    train_labels_dir = processed_data_path / "labels" / "train"
-    val_labels_dir = processed_data_path / "labels" / "val"
-    
-    train_images_dir.mkdir(parents=True, exist_ok=True)
-    val_images_dir.mkdir(parents=True, exist_ok=True)
-    train_labels_dir.mkdir(parents=True, exist_ok=True)
-    val_labels_dir.mkdir(parents=True, exist_ok=True)
+    # 图片尺寸缓存：重复运行时不再打开任何PNG
+    size_cache = ImageSizeCache(default_cache_path(project_root))
 
-    # 2. 获取所有文件并进行配对
+    # 1. 获取所有文件并进行配对
     all_image_files = sorted([f for f in os.listdir(raw_images_path) if f.endswith('.png')])
     
-    # 3. 随机打乱并划分数据集
+    # 2. 随机打乱并划分数据集
     random.seed(42) # 使用固定的随机种子，确保每次划分结果都一样
     random.shuffle(all_image_files)
 
@@ -77,41 +155,42 @@ def main():
 
     print(f"数据集划分完成: {len(train_files)} 张训练图片, {len(val_files)} 张验证图片。")
 
-    # 4. 处理并保存训练集
-    print("\n正在处理训练集...")
-    for filename in tqdm(train_files, desc="处理训练集"):
-        base_name = filename.split('.')[0]
-        
-        # 复制图片
-        shutil.copy(raw_images_path / filename, train_images_dir / filename)
-        
-        # 转换并保存标签
-        img = Image.open(raw_images_path / filename)
-        yolo_label_content = convert_pennfudan_txt_to_yolo(
-            raw_labels_path / f"{base_name}.txt",
-            img.width,
-            img.height
-        )
-        with open(train_labels_dir / f"{base_name}.txt", 'w') as f:
-            f.write(yolo_label_content)
-
-    # 5. 处理并保存验证集
-    print("\n正在处理验证集...")
-    for filename in tqdm(val_files, desc="处理验证集"):
-        base_name = filename.split('.')[0]
-        
-        # 复制图片
-        shutil.copy(raw_images_path / filename, val_images_dir / filename)
-        
-        # 转换并保存标签
-        img = Image.open(raw_images_path / filename)
-        yolo_label_content = convert_pennfudan_txt_to_yolo(
-            raw_labels_path / f"{base_name}.txt",
-            img.width,
-            img.height
-        )
-        with open(val_labels_dir / f"{base_name}.txt", 'w') as f:
-            f.write(yolo_label_content)
+    # 3. 增量物化：不再清空 data/processed，只更新和期望划分不一致的文件
+    for split, split_name, files in [("train", "训练集", train_files), ("val", "验证集", val_files)]:
+        print(f"\n正在处理{split_name}...")
+        images_dir = processed_data_path / "images" / split
+        labels_dir = processed_data_path / "labels" / split
+
+        # 链接图片（已经是最新的文件不会被触碰）
+        desired_images = {filename: raw_images_path / filename for filename in files}
+        image_stats = sync_directory(images_dir, desired_images, MATERIALIZE_MODE)
+        print(f"图片: {image_stats}")
+
+        # 转换并保存标签（内容没变的 .txt 不重写）
+        labels_dir.mkdir(parents=True, exist_ok=True)
+        desired_labels = {f"{filename.split('.')[0]}.txt" for filename in files}
+        for entry in os.scandir(labels_dir):
+            if entry.name not in desired_labels:
+                remove_entry(entry.path)
+
+        # 先解析整个集合的标注，再把所有框一起归一化和格式化
+        base_names = [filename.split('.')[0] for filename in files]
+        per_image = [pennfudan_txt_to_boxes(raw_labels_path / f"{base_name}.txt")
+                     for base_name in tqdm(base_names, desc=f"处理{split_name}")]
+        sizes = [size_cache.get(raw_images_path / filename) for filename in files]
+        texts, arrays = xyxy_to_yolo_batch(per_image, sizes)
+
+        packed = PackedLabelWriter(processed_data_path / "labels" / f"{split}.packed") if WRITE_PACKED else None
+        written = 0
+        for base_name, text, (class_ids, xywhn) in zip(base_names, texts, arrays):
+            written += write_if_changed(labels_dir / f"{base_name}.txt", text)
+            if packed is not None:
+                packed.add(base_name, to_rows(class_ids, xywhn))
+        if packed is not None:
+            packed.close()
+        print(f"标签: 更新了 {written} 个，{len(files) - written} 个未变化。")
+
+    size_cache.save()
 
     print("\n✅ 数据集准备完成！所有文件已保存到 data/processed 目录。")
 
@@ -0,0 +1,133 @@
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+
+# 学习ROI时用来累计检测位置的热力图尺寸（行, 列）
+HEATMAP_SHAPE = (36, 64)
+# 裁剪框对齐到模型步长的整数倍，避免letterbox再补边
+ROI_ALIGN = 32
+
+
+def _align(x1: int, y1: int, x2: int, y2: int, width: int, height: int):
+    """把 (x1, y1, x2, y2) 向外扩到 ROI_ALIGN 的整数倍，并限制在图片范围内。"""
+    x1, y1 = (x1 // ROI_ALIGN) * ROI_ALIGN, (y1 // ROI_ALIGN) * ROI_ALIGN
+    x2 = min(-(-x2 // ROI_ALIGN) * ROI_ALIGN, width)
+    y2 = min(-(-y2 // ROI_ALIGN) * ROI_ALIGN, height)
+    return max(x1, 0), max(y1, 0), x2, y2
+
+
+def roi_from_heatmap(heatmap: np.ndarray, coverage: float = 0.99, margin: float = 0.05):
+    """
+    根据检测热力图求ROI：分别在行和列方向上取覆盖 coverage 比例检测量的最小区间，再向外扩 margin。
+    返回归一化的 (x1, y1, x2, y2)；热力图为空时返回整幅画面。
+    """
+    total = heatmap.sum()
+    if total <= 0:
+        return 0.0, 0.0, 1.0, 1.0
+    tail = (1.0 - coverage) / 2.0
+    bounds = []
+    for profile in (heatmap.sum(axis=0), heatmap.sum(axis=1)):
+        cdf = np.cumsum(profile) / total
+        lo = int(np.searchsorted(cdf, tail, side='right'))
+        hi = int(np.searchsorted(cdf, 1.0 - tail, side='left')) + 1
+        bounds.append((lo / len(profile), hi / len(profile)))
+    (x1, x2), (y1, y2) = bounds
+    return max(x1 - margin, 0.0), max(y1 - margin, 0.0), min(x2 + margin, 1.0), min(y2 + margin, 1.0)
+
+
+class ROIDetector:
+    """
+    只在感兴趣区域（ROI）内做检测，跳过天空和车头等没有目标的区域，然后把框映射回整帧坐标。
+    roi 为归一化的 (x1, y1, x2, y2)，给出时使用固定ROI；
+    roi=None 时自动学习：前 learn_frames 帧用整帧推理，把检测框累计到热力图上，之后按热力图确定ROI；
+    每隔 refresh_every 帧仍然做一次整帧推理，继续更新热力图，出现在ROI外的目标会逐渐把ROI扩大。
+    返回与 model.predict 相同的 Results 列表（orig_img 为整帧）。
+    """
+
+    def __init__(self, model: YOLO, roi=None, learn_frames: int = 90, refresh_every: int = 300,
+                 coverage: float = 0.99, margin: float = 0.05, **predict_kwargs):
+        self.model = model
+        self.static_roi = tuple(roi) if roi is not None else None
+        self.learn_frames = learn_frames
+        self.refresh_every = refresh_every
+        self.coverage = coverage
+        self.margin = margin
+        self.predict_kwargs = {"verbose": False, **predict_kwargs}
+        self.heatmap = np.zeros(HEATMAP_SHAPE, dtype=np.float64)
+        self.frames = 0
+        self.full_frames = 0
+        self.pixels = 0
+        self.full_pixels = 0
+        self._roi = self.static_roi
+
+    @property
+    def roi(self):
+        """当前的归一化ROI；自动学习尚未完成时为 None。"""
+        return self._roi
+
+    @property
+    def pixel_ratio(self) -> float:
+        """实际送入模型的像素占整帧像素的比例。"""
+        return self.pixels / self.full_pixels if self.full_pixels else 1.0
+
+    def _accumulate(self, results: Results):
+        rows, cols = HEATMAP_SHAPE
+        xyxyn = results.boxes.xyxyn.cpu().numpy()
+        for x1, y1, x2, y2 in xyxyn:
+            c1, c2 = int(x1 * cols), max(int(np.ceil(x2 * cols)), int(x1 * cols) + 1)
+            r1, r2 = int(y1 * rows), max(int(np.ceil(y2 * rows)), int(y1 * rows) + 1)
+            self.heatmap[r1:r2, c1:c2] += 1
+
+    def _needs_full_frame(self) -> bool:
+        if self.static_roi is not None:
+            return False
+        if self.frames < self.learn_frames:
+            return True
+        return self.refresh_every is not None and self.frames % self.refresh_every == 0
+
+    def _pixel_box(self, width: int, height: int):
+        x1, y1, x2, y2 = self._roi
+        return _align(int(x1 * width), int(y1 * height), int(np.ceil(x2 * width)), int(np.ceil(y2 * height)),
+                      width, height)
+
+    def __call__(self, frames) -> list:
+        crops, origins, full_flags = [], [], []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            full = self._roi is None or self._needs_full_frame()
+            if full:
+                x1, y1, x2, y2 = 0, 0, width, height
+            else:
+                x1, y1, x2, y2 = self._pixel_box(width, height)
+            crops.append(frame if full else np.ascontiguousarray(frame[y1:y2, x1:x2]))
+            origins.append((x1, y1))
+            full_flags.append(full)
+            self.frames += 1
+            self.pixels += (x2 - x1) * (y2 - y1)
+            self.full_pixels += width * height
+
+        crop_results = self.model.predict(crops, **self.predict_kwargs)
+
+        outputs = []
+        for frame, (x0, y0), full, results in zip(frames, origins, full_flags, crop_results):
+            if full:
+                self.full_frames += 1
+                if self.static_roi is None:
+                    self._accumulate(results)
+                outputs.append(results)
+                continue
+            data = results.boxes.data.clone()
+            data[:, [0, 2]] += x0
+            data[:, [1, 3]] += y0
+            outputs.append(Results(frame, path=results.path, names=results.names, boxes=data))
+
+        if self.static_roi is None and self.frames >= self.learn_frames and any(full_flags):
+            self._roi = roi_from_heatmap(self.heatmap, self.coverage, self.margin)
+        return outputs
+
+    def describe(self) -> str:
+        if self._roi is None:
+            return "ROI尚未学习完成"
+        x1, y1, x2, y2 = self._roi
+        kind = "固定" if self.static_roi is not None else "自动学习"
+        return f"{kind}ROI x:[{x1:.2f}, {x2:.2f}] y:[{y1:.2f}, {y2:.2f}]，送入模型的像素为整帧的 {self.pixel_ratio:.0%}"
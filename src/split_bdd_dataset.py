@@ -1,25 +1,120 @@
+import hashlib
+import json
 import os
 import random
 import shutil
 from pathlib import Path
+import yaml
 from tqdm import tqdm
+from class_index import build_class_index, repeat_factor_list, repeat_factors, stratified_split, summarize_repeats
 
-def main():
+def hash_fraction(name: str, salt: str) -> float:
+    """把文件名哈希到 [0, 1) 区间。同一个文件名和 salt 永远得到同一个值，与文件的顺序和数量无关。"""
+    digest = hashlib.sha1(f"{salt}:{name}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+def assign_split(names, val_ratio: float, salt: str):
     """
-    主函数，用于将BDD100K的训练集划分为新的训练集和验证集。
+    基于哈希的确定性划分：哈希值小于 val_ratio 的进入验证集。
+    增加新图片不会改变已有图片的归属；调大比例时原来的验证图片仍然留在验证集中。
+    返回排好序的 (train_names, val_names)。
     """
-    print("--- 开始划分BDD100K数据集 ---")
-
-    # --- 1. 定义参数和路径 ---
-    # 定义验证集所占的比例（例如0.2代表20%）
-    VALIDATION_SPLIT = 0.2
-    
-    # 使用固定的随机种子，确保每次划分结果都一样，便于复现
-    RANDOM_SEED = 42
-
-    project_root = Path(__file__).parent.parent
-    base_path = project_root / "data" / "raw" / "bdd100k"
+    train_names, val_names = [], []
+    for name in sorted(names):
+        (val_names if hash_fraction(name, salt) < val_ratio else train_names).append(name)
+    return train_names, val_names
+
+def write_image_list(list_path: Path, image_paths):
+    """写出Ultralytics可以直接使用的图片列表文件（以 ./ 开头的路径相对于列表文件所在目录）。"""
+    with open(list_path, 'w') as f:
+        f.write("\n".join(image_paths) + "\n")
+    return hashlib.sha1(list_path.read_bytes()).hexdigest()
+
+def write_dataset_yaml(yaml_path: Path, base_path: Path, train_list: str, val_list: str, names: dict):
+    """写出指向划分列表的数据集配置文件，可以直接传给 model.train(data=...)。"""
+    config = {
+        'path': str(base_path.absolute()),
+        'train': train_list,
+        'val': val_list,
+        'names': names,
+    }
+    with open(yaml_path, 'w') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+
+def split_by_index(base_path: Path, source_splits, val_ratio: float, salt: str, names: dict,
+                   stratify: bool = False, rfs_threshold: float = None):
+    """
+    索引文件模式：不移动任何图片，只写出 train/val 图片列表、划分清单和数据集配置。
+    可以随时以任意比例重新生成，多次运行结果完全一致。
+    stratify=True 时根据类别索引做分层划分；rfs_threshold 不为空时额外写出重复因子采样后的训练列表
+    train_rfs.txt 以及对应的 bdd100k_rfs.yaml。
+    """
+    images_base_path = base_path / "images"
 
+    image_paths = {}
+    for split in source_splits:
+        image_dir = images_base_path / split
+        if not image_dir.exists():
+            print(f"警告：图片目录 {image_dir} 未找到，跳过。")
+            continue
+        for entry in os.scandir(image_dir):
+            if entry.name.endswith('.jpg'):
+                image_paths[entry.name] = f"./images/{split}/{entry.name}"
+
+    counts = None
+    if stratify or rfs_threshold is not None:
+        image_names, counts = build_class_index(base_path, image_paths, len(names), base_path / "class_index.npz")
+
+    if stratify:
+        train_names, val_names = stratified_split(image_names, counts, val_ratio, lambda n: hash_fraction(n, salt))
+    else:
+        train_names, val_names = assign_split(image_paths, val_ratio, salt)
+
+    print(f"总共有 {len(image_paths)} 张图片。")
+    print(f"验证集 {len(val_names)} 张 ({len(val_names) / max(len(image_paths), 1):.1%})，训练集 {len(train_names)} 张。")
+
+    train_digest = write_image_list(base_path / "train_split.txt", [image_paths[n] for n in train_names])
+    val_digest = write_image_list(base_path / "val_split.txt", [image_paths[n] for n in val_names])
+
+    manifest = {
+        "method": "stratified-sha1-hash" if stratify else "sha1-hash",
+        "salt": salt,
+        "val_ratio": val_ratio,
+        "source_splits": list(source_splits),
+        "num_images": len(image_paths),
+        "num_train": len(train_names),
+        "num_val": len(val_names),
+        "train_list": "train_split.txt",
+        "val_list": "val_split.txt",
+        "train_list_sha1": train_digest,
+        "val_list_sha1": val_digest,
+    }
+
+    if rfs_threshold is not None:
+        # 只对训练集做重复因子采样，验证集保持原样
+        row_of = {name: i for i, name in enumerate(image_names)}
+        train_rows = [row_of[n] for n in train_names]
+        factors = repeat_factors(counts[train_rows], rfs_threshold)
+        summarize_repeats(counts[train_rows], factors, names)
+        rfs_names = repeat_factor_list(train_names, factors, int(hashlib.sha1(salt.encode()).hexdigest()[:8], 16))
+        manifest["rfs_threshold"] = rfs_threshold
+        manifest["rfs_list"] = "train_rfs.txt"
+        manifest["num_train_rfs"] = len(rfs_names)
+        manifest["train_rfs_sha1"] = write_image_list(base_path / "train_rfs.txt", [image_paths[n] for n in rfs_names])
+        write_dataset_yaml(base_path / "bdd100k_rfs.yaml", base_path, "train_rfs.txt", "val_split.txt", names)
+        print(f"重复因子采样后的训练列表共 {len(rfs_names)} 条（原始 {len(train_names)} 张）。")
+
+    with open(base_path / "split_manifest.json", 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    write_dataset_yaml(base_path / "bdd100k_split.yaml", base_path, "train_split.txt", "val_split.txt", names)
+    print(f"划分列表、清单和数据集配置已写入: {base_path}")
+
+def split_by_moving(base_path: Path, val_ratio: float, seed: int):
+    """
+    旧的划分方式：把一部分图片和标签从 train 物理移动到 val。
+    注意：重复运行会在已经缩小的训练集上再次划分，并且会破坏原始目录结构。
+    """
     images_base_path = base_path / "images"
     labels_base_path = base_path / "labels"
 
@@ -31,22 +126,22 @@ def main():
     val_images_dir = images_base_path / "val"
     val_labels_dir = labels_base_path / "val"
 
-    # --- 2. 创建验证集文件夹 ---
+    # --- 创建验证集文件夹 ---
     print("正在创建验证集文件夹...")
     val_images_dir.mkdir(exist_ok=True)
     val_labels_dir.mkdir(exist_ok=True)
 
-    # --- 3. 随机抽样 ---
+    # --- 随机抽样 ---
     # 获取所有训练图片的列表（假设图片都是.jpg格式）
     all_images = [f for f in os.listdir(source_images_dir) if f.endswith('.jpg')]
-    
+
     # 设置随机种子并打乱列表
-    random.seed(RANDOM_SEED)
+    random.seed(seed)
     random.shuffle(all_images)
 
     # 计算划分点
-    split_point = int(len(all_images) * VALIDATION_SPLIT)
-    
+    split_point = int(len(all_images) * val_ratio)
+
     # 获取要移动到验证集的文件列表
     files_to_move = all_images[:split_point]
 
@@ -54,7 +149,7 @@ def main():
     print(f"将移动 {len(files_to_move)} 张图片到验证集。")
     print(f"剩余 {len(all_images) - len(files_to_move)} 张图片作为新的训练集。")
 
-    # --- 4. 移动文件 ---
+    # --- 移动文件 ---
     print("\n正在移动文件...")
     for filename in tqdm(files_to_move, desc="移动文件到验证集"):
         base_name = filename.split('.')[0]
@@ -71,11 +166,50 @@ def main():
         # 移动图片文件
         if src_image_path.exists():
             shutil.move(str(src_image_path), str(dest_image_path))
-        
+
         # 移动对应的标签文件
         if src_label_path.exists():
             shutil.move(str(src_label_path), str(dest_label_path))
 
+def main():
+    """
+    主函数，用于将BDD100K的训练集划分为新的训练集和验证集。
+    """
+    print("--- 开始划分BDD100K数据集 ---")
+
+    # --- 1. 定义参数和路径 ---
+    # 划分方式："index"（只写图片列表，不动任何文件）或 "move"（旧方式，物理移动文件）
+    SPLIT_MODE = "index"
+
+    # 定义验证集所占的比例（例如0.2代表20%）
+    VALIDATION_SPLIT = 0.2
+
+    # 使用固定的随机种子，确保每次划分结果都一样，便于复现
+    # （index 模式下它作为哈希的 salt）
+    RANDOM_SEED = 42
+
+    # index 模式从哪些图片目录收集图片。
+    # 如果以前用 move 模式把图片移到了 val，把 "val" 也加进来即可恢复完整的图片池
+    SOURCE_SPLITS = ["train"]
+
+    # 按类别分层划分，保证稀有类别（如 pedestrian、train）在训练集和验证集中按比例出现
+    STRATIFY = True
+
+    # 重复因子采样的阈值 t：包含某类别的图片比例低于 t 时，这些图片会被重复约 sqrt(t / f) 次。
+    # 设为 None 则不生成 train_rfs.txt
+    RFS_THRESHOLD = 0.1
+
+    project_root = Path(__file__).parent.parent
+    base_path = project_root / "data" / "raw" / "bdd100k"
+
+    if SPLIT_MODE == "index":
+        with open(project_root / "config" / "bdd100k.yaml") as f:
+            names = yaml.safe_load(f)['names']
+        split_by_index(base_path, SOURCE_SPLITS, VALIDATION_SPLIT, str(RANDOM_SEED), names,
+                       stratify=STRATIFY, rfs_threshold=RFS_THRESHOLD)
+    else:
+        split_by_moving(base_path, VALIDATION_SPLIT, RANDOM_SEED)
+
     print("\n✅ 数据集划分完成！")
 
 if __name__ == '__main__':
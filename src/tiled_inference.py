@@ -0,0 +1,259 @@
+import json
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+from packed_labels import parse_yolo_txt
+from video_source import VideoSource
+from yolo_box_ops import box_iou, nms, yolo_to_xyxy
+
+# COCO 的“小目标”面积阈值（像素），单独统计小目标的召回率
+SMALL_OBJECT_AREA = 32 ** 2
+
+
+def _tile_starts(length: int, tile: int, step: int) -> list:
+    """一个方向上每个切片的起点：按 step 滑动，最后一个切片贴齐图片边缘。"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(width: int, height: int, tile_size: int = 640, overlap: int = 128) -> np.ndarray:
+    """
+    把 (width, height) 的图片切成互相重叠的方形切片，返回每个切片的 (x1, y1, x2, y2)，形状 (n, 4)。
+    相邻切片重叠 overlap 像素，尺寸小于 overlap 的目标至少会完整地落在一个切片里。
+    """
+    step = max(tile_size - overlap, 1)
+    xs = _tile_starts(width, tile_size, step)
+    ys = _tile_starts(height, tile_size, step)
+    grid = np.array([(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in ys for x in xs])
+    return grid.reshape(-1, 4)
+
+
+class TiledDetector:
+    """
+    切片推理：把大图切成重叠的切片，所有切片（可选再加一张缩小的整图，用来找跨切片的大目标）一起作为一个batch推理，
+    把框平移回原图坐标后，用跨切片的NMS合并重复检测。
+    返回与 model.predict 相同的 Results 列表，可以直接交给追踪器或 results.plot()。
+    merge_metric 默认为 "iou"；"ios" 能更好地合并被切片边缘截断的半截框，
+    但也会把嵌在大框里的小目标（人群、大人和小孩）当作重复框去掉。
+    """
+
+    def __init__(self, model: YOLO, tile_size: int = 640, overlap: int = 128, include_full_frame: bool = True,
+                 conf: float = 0.25, iou_threshold: float = 0.5, merge_metric: str = "iou", max_batch: int = 32):
+        self.model = model
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.include_full_frame = include_full_frame
+        self.conf = conf
+        self.iou_threshold = iou_threshold
+        self.merge_metric = merge_metric
+        self.max_batch = max_batch
+        self._grids = {}
+
+    def tiles(self, width: int, height: int) -> np.ndarray:
+        # 视频里每帧尺寸相同，切片网格只算一次
+        key = (width, height)
+        if key not in self._grids:
+            grid = tile_grid(width, height, self.tile_size, self.overlap)
+            if self.include_full_frame and len(grid) > 1:
+                grid = np.vstack([grid, [[0, 0, width, height]]])
+            self._grids[key] = grid
+        return self._grids[key]
+
+    def _predict(self, crops: list) -> list:
+        results = []
+        for i in range(0, len(crops), self.max_batch):
+            results.extend(self.model.predict(crops[i:i + self.max_batch], imgsz=self.tile_size,
+                                              conf=self.conf, verbose=False))
+        return results
+
+    def __call__(self, frames) -> list:
+        crops, owners, origins = [], [], []
+        for frame_idx, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            for x1, y1, x2, y2 in self.tiles(width, height):
+                crops.append(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+                owners.append(frame_idx)
+                origins.append((x1, y1))
+        tile_results = self._predict(crops)
+
+        per_frame = [[] for _ in frames]
+        for frame_idx, (x0, y0), results in zip(owners, origins, tile_results):
+            data = results.boxes.data.cpu().numpy()
+            if len(data):
+                data = data.copy()
+                data[:, [0, 2]] += x0
+                data[:, [1, 3]] += y0
+                per_frame[frame_idx].append(data)
+
+        merged = []
+        for frame, chunks in zip(frames, per_frame):
+            data = np.concatenate(chunks) if chunks else np.zeros((0, 6), dtype=np.float32)
+            keep = nms(data[:, :4], data[:, 4], data[:, 5], self.iou_threshold, self.merge_metric)
+            boxes = torch.as_tensor(data[keep], dtype=torch.float32)
+            merged.append(Results(frame, path='', names=self.model.names, boxes=boxes))
+        return merged
+
+
+def _read_labeled_images(image_dir: Path, label_dir: Path):
+    """读取图片和对应YOLO标签（转换成像素坐标），返回 [(图片, 类别数组, xyxy数组)]。"""
+    samples = []
+    for image_path in sorted(p for p in image_dir.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png')):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        label_path = label_dir / f"{image_path.stem}.txt"
+        rows = parse_yolo_txt(label_path) if label_path.exists() else np.empty((0, 5))
+        height, width = image.shape[:2]
+        samples.append((image, rows[:, 0].astype(np.int64), yolo_to_xyxy(rows[:, 1:], width, height)))
+    return samples
+
+
+def _sample_video_frames(video_path: Path, count: int, step: int):
+    """
+    从视频中每隔 step 帧取一帧，最多取 count 帧，返回 [(帧, None, None)]（视频帧没有标签）。
+    所有帧都留在内存里（4K 每帧约 25MB），count 不宜太大。
+    """
+    samples = []
+    with VideoSource(video_path) as source:
+        print(f"视频信息: {source.describe()}")
+        for i, frame in enumerate(source):
+            if i % step == 0:
+                samples.append((frame, None, None))
+                if len(samples) >= count:
+                    break
+    return samples
+
+
+def _recall_stats(samples, predictions, iou_threshold: float = 0.5) -> dict:
+    """按类别匹配，统计召回率（全部目标 / 小目标）和精确率。"""
+    found = total = small_found = small_total = correct = predicted = 0
+    for (_, gt_cls, gt_xyxy), results in zip(samples, predictions):
+        pred_xyxy = results.boxes.xyxy.cpu().numpy()
+        pred_cls = results.boxes.cls.cpu().numpy()
+        iou = box_iou(gt_xyxy, pred_xyxy)
+        iou[gt_cls[:, None] != pred_cls[None, :]] = 0
+        hit = iou.max(axis=1) >= iou_threshold if iou.size else np.zeros(len(gt_xyxy), dtype=bool)
+        small = (gt_xyxy[:, 2:] - gt_xyxy[:, :2]).prod(axis=1) < SMALL_OBJECT_AREA
+        found += int(hit.sum())
+        total += len(gt_xyxy)
+        small_found += int(hit[small].sum())
+        small_total += int(small.sum())
+        correct += int((iou.max(axis=0) >= iou_threshold).sum()) if iou.size else 0
+        predicted += len(pred_xyxy)
+    return {
+        "recall": found / total if total else 0.0,
+        "small_recall": small_found / small_total if small_total else None,
+        "precision": correct / predicted if predicted else 0.0,
+    }
+
+
+def benchmark_tiling(model: YOLO, samples, configs, conf: float = 0.25) -> list:
+    """
+    比较整图推理和不同切片配置的吞吐、检测数，以及（有标签时）召回率。
+    samples 为 [(图片, 类别数组, xyxy数组)]，没有标签的图片（例如视频帧）类别和框为 None；
+    configs 为 [(tile_size, overlap), ...]；整图推理（imgsz=640）总是作为第一行基准。
+    图片不大于切片时切片推理就是整图推理，所有图片都只有一个切片的配置会被跳过。
+    """
+    if not samples:
+        return []
+    images = [s[0] for s in samples]
+    labeled = all(s[1] is not None for s in samples)
+    # 预热
+    model.predict(images[0], conf=conf, verbose=False)
+
+    runs = [("整图", lambda batch: model.predict(batch, conf=conf, verbose=False))]
+    for tile_size, overlap in configs:
+        detector = TiledDetector(model, tile_size=tile_size, overlap=overlap, conf=conf)
+        single = sum(len(detector.tiles(image.shape[1], image.shape[0])) == 1 for image in images)
+        if single == len(images):
+            print(f"⚠️ 警告：所有图片都能放进一个 {tile_size} 的切片，切片 {tile_size}/{overlap} 等于整图推理，跳过。")
+            continue
+        if single:
+            print(f"⚠️ 警告：{single}/{len(images)} 张图片在切片 {tile_size}/{overlap} 下只有一个切片。")
+        runs.append((f"切片 {tile_size}/{overlap}", detector))
+
+    report = []
+    for name, detect in runs:
+        start = time.perf_counter()
+        predictions = []
+        for image in images:
+            predictions.extend(detect([image]))
+        seconds = time.perf_counter() - start
+        areas = [r.boxes.xywh[:, 2:].prod(dim=1).cpu().numpy() for r in predictions]
+        row = {"mode": name, "images_per_second": len(images) / seconds if seconds > 0 else 0.0,
+               "detections_per_image": sum(len(a) for a in areas) / len(images),
+               "small_detections_per_image": sum(int((a < SMALL_OBJECT_AREA).sum()) for a in areas) / len(images)}
+        if labeled:
+            row.update(_recall_stats(samples, predictions))
+        report.append(row)
+    return report
+
+
+def main():
+    """
+    主函数，比较整图推理和切片推理在高分辨率图片上的速度与召回率。
+    默认从4K演示视频中抽帧（没有标签，只比较速度和检测数）；
+    设置 IMAGE_DIR 后改用带YOLO标签的图片，额外统计召回率。
+    """
+    # 要比较的切片配置：(切片边长, 重叠像素)
+    TILE_CONFIGS = [(640, 128), (960, 160), (1280, 256)]
+    CONF = 0.25
+    # 从视频中抽取的帧数和间隔（每秒一帧）
+    NUM_FRAMES = 8
+    FRAME_STEP = 30
+
+    print("--- 开始评估切片推理 ---")
+    project_root = Path(__file__).parent.parent
+    model_path = project_root / "runs/detect/yolov8m_final_tuning_v4/weights/best.pt" # 请确保这是您正确的模型路径！
+    # 切片只对比切片大得多的图片有意义：默认使用 3840x2160 的演示视频
+    video_path = project_root / "data/raw/13142111_2160_3840_30fps.mp4"
+    # 带YOLO标签的高分辨率图片目录（例如 project_root / "data/processed/images/val"），为 None 时使用视频
+    IMAGE_DIR = None
+    report_path = project_root / "results/tiled_inference_report.json"
+
+    if not model_path.exists():
+        print(f"❌ 错误：找不到模型文件: {model_path}")
+        return
+
+    if IMAGE_DIR is not None:
+        image_dir = Path(IMAGE_DIR)
+        if not image_dir.exists():
+            print(f"❌ 错误：找不到图片目录: {image_dir}")
+            return
+        samples = _read_labeled_images(image_dir, image_dir.parent.parent / "labels" / image_dir.name)
+    else:
+        if not video_path.exists():
+            print(f"❌ 错误：找不到视频文件: {video_path}")
+            return
+        samples = _sample_video_frames(video_path, NUM_FRAMES, FRAME_STEP)
+    if not samples:
+        print("❌ 错误：没有读到任何图片。")
+        return
+    height, width = samples[0][0].shape[:2]
+    print(f"测试图片: {len(samples)} 张，第一张 {width}x{height}")
+
+    model = YOLO(model_path)
+    report = benchmark_tiling(model, samples, TILE_CONFIGS, conf=CONF)
+
+    print(f"\n{'模式':<16} {'图片/秒':>8} {'检测数':>7} {'小目标数':>8} {'召回率':>7} {'小目标召回':>10} {'精确率':>7}")
+    for row in report:
+        recall = f"{row['recall']:.3f}" if "recall" in row else "-"
+        small = f"{row['small_recall']:.3f}" if row.get('small_recall') is not None else "-"
+        precision = f"{row['precision']:.3f}" if "precision" in row else "-"
+        print(f"{row['mode']:<16} {row['images_per_second']:>8.2f} {row['detections_per_image']:>7.1f} "
+              f"{row['small_detections_per_image']:>8.1f} {recall:>7} {small:>10} {precision:>7}")
+
+    report_path.parent.mkdir(exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 评估完成！报告已保存到: {report_path}")
+
+if __name__ == '__main__':
+    main()
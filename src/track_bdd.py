@@ -1,12 +1,32 @@
-import cv2
 from ultralytics import YOLO
 from pathlib import Path
 import numpy # 最好导入一下
+from adaptive_tracking import AdaptiveTracker
+from detection_log import DetectionLogWriter, default_log_path
+from roi import ROIDetector
+from tracking import TRACK_CONF, create_tracker, update_tracker
+from video_pipeline import print_pipeline_stats, run_video_pipeline
+from video_source import VideoSource
 
 def main():
     """
     主函数，使用在BDD100K上训练的模型进行视频目标追踪。
     """
+    # 每隔几帧运行一次检测器，中间帧用卡尔曼预测（1 = 每帧都检测）
+    # 先运行 adaptive_tracking.py 查看各个 stride 的精度和速度再选择
+    DETECT_STRIDE = 1
+    # 画面变化超过这个值时提前检测（仅 DETECT_STRIDE > 1 时生效）
+    MOTION_THRESHOLD = 12.0
+    # 感兴趣区域（默认关闭）：None = 整帧检测（使用 model.track），"auto" = 根据前几秒的检测位置自动学习，
+    # 或者给出归一化的 (x1, y1, x2, y2)，例如 (0.0, 0.3, 1.0, 0.85) 去掉天空和车头
+    ROI = None
+    # 是否画框并写出结果视频；设为 False 时跳过绘制和编码，只做检测/追踪（最快）
+    RENDER_VIDEO = True
+    # 写视频的编码器："opencv"（cv2.VideoWriter + mp4v）、"ffmpeg"（管道 + 多线程x264）或 "auto"（有ffmpeg就用ffmpeg）
+    VIDEO_ENCODER = "auto"
+    # 是否把每帧的检测结果（帧号、追踪ID、类别、框、置信度）写成列式日志，之后分析时不需要重新跑推理
+    WRITE_DETECTIONS = True
+
     print("--- 开始使用BDD100K模型进行视频目标追踪 ---")
 
     # --- 1. 定义路径 ---
@@ -21,6 +41,8 @@ def main():
     # 定义保存追踪结果的输出视频路径
     output_video_path = project_root / "results/tokyo_drive_V15_FIXED_output.mp4"
     output_video_path.parent.mkdir(exist_ok=True)
+    # 检测日志：有 pyarrow 时为 .parquet，否则为 .bin + .json
+    detections_path = default_log_path(project_root / "results/tokyo_drive_V15_FIXED_detections")
 
     # --- 2. 加载模型 ---
     if not model_path.exists():
@@ -42,36 +64,60 @@ def main():
     # 我们调用 model.track() 而不是 model.predict()
     # tracker='bytetrack.yaml' 指定使用ByteTrack算法
     # persist=True 让追踪器记住跨帧的对象
-    results_generator = model.track(source=str(input_video_path), tracker='bytetrack.yaml', persist=True, stream=True)
-    
-    # 准备写入视频 (和之前一样)
-    cap = cv2.VideoCapture(str(input_video_path))
-    if not cap.isOpened():
-        print(f"❌ 错误：无法打开视频文件: {input_video_path}")
+    # 解码、追踪、标注+编码分别在不同的线程中进行，模型不再等待画框和写视频
+    def infer_fn(frames):
+        return model.track(frames, tracker='bytetrack.yaml', persist=True, verbose=False)
+
+    # 只打开一次输入视频：解码器和 fps/分辨率 都来自同一个 VideoSource
+    try:
+        source = VideoSource(input_video_path)
+    except IOError as e:
+        print(f"❌ 错误：{e}")
         return
-        
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(str(output_video_path), fourcc, fps, (width, height))
+    print(f"视频信息: {source.describe()}")
 
-    frame_count = 0
-    # 逐帧处理追踪结果
-    for results in results_generator:
-        # results.plot() 会自动画出带有ID的追踪框！
-        annotated_frame = results.plot() 
-        out.write(annotated_frame)
-        frame_count += 1
-        if frame_count % 100 == 0:
-            print(f"   ... 已处理 {frame_count} 帧 ...")
-    
-    # 清理资源
-    cap.release()
-    out.release()
+    # 使用ROI时检测结果交给独立的ByteTrack追踪器；conf 与 model.track 的默认值一致
+    roi_detector = None
+    if ROI is not None:
+        roi_detector = ROIDetector(model, roi=None if ROI == "auto" else ROI, conf=TRACK_CONF)
+        tracker = create_tracker(source.fps)
+
+        def infer_fn(frames):
+            return [update_tracker(tracker, results) for results in roi_detector(frames)]
+
+    adaptive = None
+    if DETECT_STRIDE > 1:
+        adaptive = AdaptiveTracker(model, source.fps, stride=DETECT_STRIDE, motion_threshold=MOTION_THRESHOLD,
+                                   detector=roi_detector)
+        infer_fn = adaptive
+        print(f"跳帧追踪：每 {DETECT_STRIDE} 帧检测一次，画面变化超过 {MOTION_THRESHOLD} 时提前检测")
+
+    if not RENDER_VIDEO:
+        output_video_path = None
+        print("RENDER_VIDEO=False：不绘制、不写出视频")
+
+    detection_log = DetectionLogWriter(detections_path, names=model.names, fps=source.fps) if WRITE_DETECTIONS else None
+    try:
+        with source:
+            # 默认的 FastRenderer 会直接在帧上画出带有ID的追踪框
+            stats = run_video_pipeline(source, output_video_path, infer_fn,
+                                       on_result=detection_log.add if detection_log is not None else None,
+                                       encoder=VIDEO_ENCODER)
+    finally:
+        if detection_log is not None:
+            detection_log.close()
+    frame_count = stats["frames"]
+    print_pipeline_stats(stats)
+    if adaptive is not None:
+        print(f"实际运行检测器的帧比例: {adaptive.detect_ratio:.1%}")
+    if roi_detector is not None:
+        print(roi_detector.describe())
 
     print(f"\n✅ 视频追踪完成！ (共 {frame_count} 帧)")
-    print(f"结果已保存到文件: {output_video_path}")
+    if output_video_path is not None:
+        print(f"结果已保存到文件: {output_video_path}")
+    if detection_log is not None:
+        print(f"检测日志已保存到: {detections_path} （{detection_log.rows} 个框）")
 
 if __name__ == '__main__':
     main()
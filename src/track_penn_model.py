@@ -1,12 +1,30 @@
-import cv2
 from ultralytics import YOLO
 from pathlib import Path
 import numpy # 最好导入一下
+from tiled_inference import TiledDetector
+from tracking import TRACK_CONF, create_tracker, update_tracker
+from video_pipeline import print_pipeline_stats, run_video_pipeline
+from video_source import VideoSource
 
 def main():
     """
     主函数，使用在BDD100K上训练的模型进行视频目标追踪。
     """
+    # 离线处理存档视频时每次前向推理的帧数（CPU节点上batch越大吞吐越高），设为1则逐帧推理
+    BATCH_SIZE = 4
+    # 凑满一个batch最多等待的秒数
+    MAX_BATCH_LATENCY = 0.1
+    # 切片推理：4K画面直接缩放到640时远处的小行人会消失，切成重叠的小块分别检测后再合并
+    # 默认关闭：4K画面按 640/128 切片时每帧要推理 33 次（32 个切片 + 整图）
+    # 先运行 tiled_inference.py 比较不同切片配置的速度和召回率再选择
+    TILED = False
+    TILE_SIZE = 640
+    TILE_OVERLAP = 128
+    # 是否画框并写出结果视频；设为 False 时跳过绘制和编码，只做检测/追踪（最快）
+    RENDER_VIDEO = True
+    # 写视频的编码器："opencv"（cv2.VideoWriter + mp4v）、"ffmpeg"（管道 + 多线程x264）或 "auto"（有ffmpeg就用ffmpeg）
+    VIDEO_ENCODER = "auto"
+
     print("--- 开始使用BDD100K模型进行视频目标追踪 ---")
 
     # --- 1. 定义路径 ---
@@ -42,36 +60,43 @@ def main():
     # 我们调用 model.track() 而不是 model.predict()
     # tracker='bytetrack.yaml' 指定使用ByteTrack算法
     # persist=True 让追踪器记住跨帧的对象
-    results_generator = model.track(source=str(input_video_path), tracker='bytetrack.yaml', persist=True, stream=True)
-    
-    # 准备写入视频 (和之前一样)
-    cap = cv2.VideoCapture(str(input_video_path))
-    if not cap.isOpened():
-        print(f"❌ 错误：无法打开视频文件: {input_video_path}")
+    # 多帧合成一个batch一起推理；同一个batch内的帧仍然按顺序依次更新追踪器
+    def infer_fn(frames):
+        return model.track(frames, tracker='bytetrack.yaml', persist=True, verbose=False)
+
+    # 只打开一次输入视频：解码器和 fps/分辨率 都来自同一个 VideoSource
+    try:
+        source = VideoSource(input_video_path)
+    except IOError as e:
+        print(f"❌ 错误：{e}")
         return
-        
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(str(output_video_path), fourcc, fps, (width, height))
+    print(f"视频信息: {source.describe()}")
 
-    frame_count = 0
-    # 逐帧处理追踪结果
-    for results in results_generator:
-        # results.plot() 会自动画出带有ID的追踪框！
-        annotated_frame = results.plot() 
-        out.write(annotated_frame)
-        frame_count += 1
-        if frame_count % 100 == 0:
-            print(f"   ... 已处理 {frame_count} 帧 ...")
-    
-    # 清理资源
-    cap.release()
-    out.release()
+    if TILED:
+        # 切片检测的结果直接交给独立的ByteTrack追踪器；conf 与 model.track 的默认值一致，
+        # 让ByteTrack能用上低分框做第二轮匹配
+        detector = TiledDetector(model, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, conf=TRACK_CONF)
+        tracker = create_tracker(source.fps)
+        print(f"切片推理：每帧 {len(detector.tiles(*source.size))} 个切片（{TILE_SIZE}px，重叠 {TILE_OVERLAP}px）")
+
+        def infer_fn(frames):
+            return [update_tracker(tracker, results) for results in detector(frames)]
+
+    if not RENDER_VIDEO:
+        output_video_path = None
+        print("RENDER_VIDEO=False：不绘制、不写出视频")
+
+    with source:
+        # 默认的 FastRenderer 会直接在帧上画出带有ID的追踪框
+        stats = run_video_pipeline(source, output_video_path, infer_fn,
+                                   batch_size=BATCH_SIZE, max_batch_latency=MAX_BATCH_LATENCY,
+                                   encoder=VIDEO_ENCODER)
+    frame_count = stats["frames"]
+    print_pipeline_stats(stats)
 
     print(f"\n✅ 视频追踪完成！ (共 {frame_count} 帧)")
-    print(f"结果已保存到文件: {output_video_path}")
+    if output_video_path is not None:
+        print(f"结果已保存到文件: {output_video_path}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,34 @@
+import numpy as np
+import torch
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+# model.track 默认使用的检测置信度阈值（低于 model.predict 的 0.25），
+# ByteTrack 的第二轮关联需要这些低分检测；把检测交给独立追踪器时也应使用这个阈值
+TRACK_CONF = 0.1
+
+
+def create_tracker(frame_rate: float, tracker_yaml: str = 'bytetrack.yaml') -> BYTETracker:
+    """
+    创建一个独立的ByteTrack追踪器。
+    和 model.track(persist=True) 把追踪器挂在模型上不同，这里每路视频各自持有一个追踪器，
+    多路视频共用同一个模型时追踪状态互不干扰。
+    """
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_yaml)))
+    return BYTETracker(args=cfg, frame_rate=max(int(round(frame_rate)), 1))
+
+
+def update_tracker(tracker: BYTETracker, results):
+    """
+    用一帧的检测结果（model.predict 的单帧 Results）更新追踪器，
+    并把结果替换为带追踪ID的框（与 model.track 的输出一致，results.plot() 会画出ID）。
+    """
+    det = results.boxes.cpu().numpy()
+    tracks = tracker.update(det, results.orig_img)
+    if len(tracks) == 0:
+        return results[np.zeros(0, dtype=int)]
+    idx = tracks[:, -1].astype(int)
+    results = results[idx]
+    results.update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return results
@@ -23,6 +23,12 @@ def main():
     
     project_root = Path(__file__).parent.parent
 
+    # 如果已经用 split_bdd_dataset.py 生成了重复因子采样的训练列表，就优先使用它：
+    # 稀有类别（如 pedestrian、train）的图片在列表中重复出现，不增加每个batch的增强开销
+    rfs_yaml = project_root / "data/raw/bdd100k/bdd100k_rfs.yaml"
+    data_yaml = str(rfs_yaml) if rfs_yaml.exists() else 'config/bdd100k.yaml'
+    print(f"使用数据集配置: {data_yaml}\n")
+
     # --- 2. 加载模型 (不变) ---
     print("正在加载 yoloV8m 预训练模型...")
     model = YOLO('yolov8m.pt')
@@ -32,7 +38,7 @@ def main():
     print("--- 开始在 BDD100K 数据集上进行“平衡化”训练 (V14) ---")
     try:
         results = model.train(
-            data='config/bdd100k.yaml', # 依然使用BDD100K的“地图”
+            data=data_yaml, # 依然使用BDD100K的“地图”（有重复因子采样列表时使用采样后的列表）
             
             # 【【【关键修改 1：延长训练时间】】】
             # 50轮对于这个量级的数据集只是“热身”
@@ -0,0 +1,186 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from video_source import VideoSource
+
+
+class OpenCVEncoder:
+    """原来的写视频方式：cv2.VideoWriter，编码在调用 write() 的线程中同步完成。"""
+
+    def __init__(self, path: Path, fps: float, size, fourcc: str = 'mp4v'):
+        self.path = Path(path)
+        self.writer = cv2.VideoWriter(str(self.path), cv2.VideoWriter_fourcc(*fourcc), fps, tuple(size))
+        if not self.writer.isOpened():
+            raise IOError(f"无法创建输出视频: {self.path}")
+
+    def write(self, frame: np.ndarray):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FFmpegEncoder:
+    """
+    把原始 BGR 帧通过管道写进一个 ffmpeg 子进程，由 ffmpeg 用多线程的 x264（或硬件编码器，如 h264_nvenc）编码。
+    write() 只是把帧的字节拷进管道，真正的编码在另一个进程的多个线程中进行，不再占用Python这边的时间。
+    threads=0 表示让 x264 按CPU核心数自动选择帧级并行的线程数。
+    """
+
+    def __init__(self, path: Path, fps: float, size, codec: str = 'libx264', preset: str = 'veryfast',
+                 crf: int = 23, threads: int = 0, ffmpeg: str = 'ffmpeg'):
+        self.path = Path(path)
+        self.width, self.height = size
+        binary = shutil.which(ffmpeg)
+        if binary is None:
+            raise FileNotFoundError(f"找不到 {ffmpeg}，请先安装 ffmpeg 或改用 opencv 编码器")
+
+        cmd = [binary, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{self.width}x{self.height}", '-r', f"{fps}",
+               '-i', '-', '-an', '-c:v', codec]
+        if codec == 'libx264':
+            cmd += ['-preset', preset, '-crf', str(crf), '-threads', str(threads)]
+        # yuv420p 要求宽高为偶数
+        if self.width % 2 or self.height % 2:
+            cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        cmd += ['-pix_fmt', 'yuv420p', str(self.path)]
+
+        # ffmpeg 的错误输出写到临时文件里，避免管道写满把子进程卡住
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+        self._closed = False
+
+    def write(self, frame: np.ndarray):
+        if frame.shape[:2] != (self.height, self.width) or frame.dtype != np.uint8:
+            raise ValueError(f"帧尺寸 {frame.shape} 与编码器尺寸 {self.width}x{self.height} 不一致")
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self.proc.wait()
+        self._stderr.seek(0)
+        message = self._stderr.read().decode(errors='replace').strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg 编码失败（返回码 {returncode}）: {message}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which('ffmpeg') is not None
+
+
+def create_encoder(backend: str, path: Path, fps: float, size, **options):
+    """
+    按名字创建编码器：
+      - "opencv"：cv2.VideoWriter（mp4v）；
+      - "ffmpeg"：管道 + x264 多线程编码（options 可以指定 codec、preset、crf、threads）；
+      - "auto"：有 ffmpeg 时用 ffmpeg，否则退回 opencv。
+    """
+    if backend == "auto":
+        backend = "ffmpeg" if ffmpeg_available() else "opencv"
+    if backend == "ffmpeg":
+        return FFmpegEncoder(path, fps, size, **options)
+    if backend == "opencv":
+        return OpenCVEncoder(path, fps, size, **options)
+    raise ValueError(f"未知的编码器: {backend}（可选 opencv / ffmpeg / auto）")
+
+
+def benchmark_encoders(frames, fps: float, configs: dict, output_dir: Path) -> list:
+    """
+    用同一批帧分别测试每种编码器配置，统计编码吞吐（含 close() 中等待编码收尾的时间）和输出文件大小。
+    configs 为 {名字: (backend, options)}。
+    """
+    height, width = frames[0].shape[:2]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    report = []
+    for name, (backend, options) in configs.items():
+        if backend == "ffmpeg" and not ffmpeg_available():
+            print(f"   跳过 {name}：找不到 ffmpeg")
+            continue
+        path = output_dir / f"encode_benchmark_{name}.mp4"
+        start = time.perf_counter()
+        encoder = create_encoder(backend, path, fps, (width, height), **options)
+        for frame in frames:
+            encoder.write(frame)
+        encoder.close()
+        seconds = time.perf_counter() - start
+        report.append({
+            "encoder": name,
+            "fps": len(frames) / seconds if seconds > 0 else 0.0,
+            "seconds": seconds,
+            "megabytes": os.path.getsize(path) / 1e6,
+        })
+        path.unlink()
+    return report
+
+
+def main():
+    """
+    主函数，比较 cv2.VideoWriter 和 ffmpeg 管道编码在4K视频上的编码速度。
+    """
+    # 用视频的前 N 帧做测试（4K的帧每张约24MB，注意内存）
+    MAX_FRAMES = 120
+    ENCODER_CONFIGS = {
+        "opencv_mp4v": ("opencv", {}),
+        "ffmpeg_x264_veryfast": ("ffmpeg", {"preset": "veryfast"}),
+        "ffmpeg_x264_ultrafast": ("ffmpeg", {"preset": "ultrafast"}),
+    }
+
+    print("--- 开始测试视频编码速度 ---")
+    project_root = Path(__file__).parent.parent
+    input_video_path = project_root / "data/raw/13142111_2160_3840_30fps.mp4"
+    output_dir = project_root / "results/benchmarks"
+
+    try:
+        source = VideoSource(input_video_path)
+    except IOError as e:
+        print(f"❌ 错误：{e}")
+        return
+    with source:
+        print(f"视频信息: {source.describe()}")
+        frames = [frame for _, frame in zip(range(MAX_FRAMES), source)]
+        fps = source.fps
+    if not frames:
+        print("❌ 错误：没有读到任何帧")
+        return
+
+    report = benchmark_encoders(frames, fps, ENCODER_CONFIGS, output_dir)
+    print(f"\n{'编码器':<24} {'FPS':>7} {'文件大小(MB)':>12}")
+    for row in report:
+        print(f"{row['encoder']:<24} {row['fps']:>7.1f} {row['megabytes']:>12.1f}")
+
+    report_path = output_dir / "encoder_benchmark.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ 测试完成！报告已保存到: {report_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from pathlib import Path
+from fast_renderer import FastRenderer
+from video_encoders import create_encoder
+from video_source import VideoSource
+
+# 队列中表示“没有更多数据”的标记
+_END = object()
+
+
+class StageStats:
+    """记录一个流水线阶段处理的帧数和实际工作时间（不含等待队列的时间）。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.busy_seconds = 0.0
+
+    def add(self, frames: int, seconds: float):
+        self.frames += frames
+        self.busy_seconds += seconds
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """带停止检查的阻塞 put，下游出错退出时上游不会永远卡在满队列上。"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """带停止检查的阻塞 get。"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def _collect_batch(frame_queue: queue.Queue, stop: threading.Event, batch_size: int, max_latency: float):
+    """
+    从帧队列中凑一个batch：先阻塞等到第一帧，之后最多再等 max_latency 秒，
+    凑满 batch_size 帧或超时就返回。返回 (帧列表, 是否已经读到结尾)。
+    """
+    first = _get(frame_queue, stop)
+    if first is _END:
+        return [], True
+    frames = [first]
+    deadline = time.perf_counter() + max_latency
+    while len(frames) < batch_size:
+        remaining = deadline - time.perf_counter()
+        try:
+            frame = frame_queue.get(timeout=max(remaining, 0)) if remaining > 0 else frame_queue.get_nowait()
+        except queue.Empty:
+            break
+        if frame is _END:
+            return frames, True
+        frames.append(frame)
+    return frames, False
+
+
+def run_video_pipeline(source: VideoSource, output_video_path: Path, infer_fn, annotate_fn=None,
+                       batch_size: int = 1, max_batch_latency: float = 0.05,
+                       queue_size: int = 8, progress_every: int = 100, on_result=None,
+                       encoder: str = "opencv", encoder_options: dict = None) -> dict:
+    """
+    三段式视频处理流水线（source 由调用方打开，解码和元数据都来自它，这里不会再打开输入文件）：
+      解码线程 --(帧队列)--> 推理（当前线程）--(结果队列)--> 标注+编码线程
+    队列有上限，解码和编码不会无限制地占用内存；模型在推理下一帧时，上一帧正在被标注和写入。
+    infer_fn(frames) 接收一个帧列表，按相同顺序返回每帧的结果；annotate_fn(results) 返回要写入视频的图像，
+    默认使用 FastRenderer 直接在解码出的帧上画框（比 results.plot() 少一次整帧复制）。
+    output_video_path=None 时不写视频（只需要检测结果时跳过编码），annotate_fn 返回 None 的帧也不会写入。
+    on_result(frame_index, results) 在编码线程中按帧顺序调用（例如 DetectionLogWriter.add），在画框之前执行。
+    encoder 选择写视频的后端（见 video_encoders.create_encoder）："opencv"、"ffmpeg" 或 "auto"。
+    batch_size > 1 时把多帧合成一次前向推理（离线处理时在CPU上吞吐更高），
+    凑batch最多等待 max_batch_latency 秒，结果按帧顺序逐个交给编码线程。
+    返回各阶段和端到端的吞吐统计。
+    """
+    if annotate_fn is None:
+        # 不写视频时连框也不画
+        annotate_fn = FastRenderer() if output_video_path is not None else (lambda results: None)
+    out = None
+    if output_video_path is not None:
+        out = create_encoder(encoder, output_video_path, source.fps, source.size, **(encoder_options or {}))
+
+    frame_queue = queue.Queue(maxsize=max(queue_size, 2 * batch_size))
+    result_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    decode_stats, infer_stats, encode_stats = StageStats("解码"), StageStats("推理"), StageStats("标注+编码")
+
+    def decode_worker():
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                ok, frame = source.read()
+                if not ok:
+                    break
+                decode_stats.add(1, time.perf_counter() - start)
+                if not _put(frame_queue, frame, stop):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(frame_queue, _END, stop)
+
+    def encode_worker():
+        try:
+            while True:
+                results = _get(result_queue, stop)
+                if results is _END:
+                    break
+                start = time.perf_counter()
+                if on_result is not None:
+                    on_result(encode_stats.frames, results)
+                image = annotate_fn(results)
+                if out is not None and image is not None:
+                    out.write(image)
+                encode_stats.add(1, time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    decoder = threading.Thread(target=decode_worker, name="decoder", daemon=True)
+    encoder = threading.Thread(target=encode_worker, name="encoder", daemon=True)
+    wall_start = time.perf_counter()
+    decoder.start()
+    encoder.start()
+
+    try:
+        finished = False
+        while not finished:
+            frames, finished = _collect_batch(frame_queue, stop, batch_size, max_batch_latency)
+            if not frames:
+                break
+            start = time.perf_counter()
+            batch_results = infer_fn(frames)
+            infer_stats.add(len(frames), time.perf_counter() - start)
+
+            previous = infer_stats.frames - len(frames)
+            if not all(_put(result_queue, results, stop) for results in batch_results):
+                break
+            if infer_stats.frames // progress_every > previous // progress_every:
+                total = f" / {source.frame_count}" if source.frame_count > 0 else ""
+                print(f"   ... 已处理 {infer_stats.frames}{total} 帧 ...")
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        _put(result_queue, _END, stop)
+        decoder.join()
+        encoder.join()
+        if out is not None:
+            out.close()
+
+    if errors:
+        raise errors[0]
+
+    wall_seconds = time.perf_counter() - wall_start
+    stats = {
+        "frames": encode_stats.frames,
+        "wall_seconds": wall_seconds,
+        "end_to_end_fps": encode_stats.frames / wall_seconds if wall_seconds > 0 else 0.0,
+        "stages": {s.name: s.fps for s in (decode_stats, infer_stats, encode_stats)},
+    }
+    return stats
+
+
+def print_pipeline_stats(stats: dict):
+    """打印流水线各阶段的吞吐。端到端FPS接近最慢的那个阶段时，说明流水线已经把其余阶段完全隐藏了。"""
+    print(f"\n共 {stats['frames']} 帧，用时 {stats['wall_seconds']:.1f} 秒，端到端 {stats['end_to_end_fps']:.1f} FPS")
+    for name, fps in stats["stages"].items():
+        print(f"  - {name}: {fps:.1f} FPS")
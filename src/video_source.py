@@ -0,0 +1,51 @@
+from pathlib import Path
+import cv2
+
+
+class VideoSource:
+    """
+    视频输入的唯一入口：打开一次解码器，同时探测帧率、分辨率和总帧数。
+    推理和写视频都从这里拿帧和元数据，不再为了读取 fps/宽高 而重复打开同一个文件。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.cap = cv2.VideoCapture(str(self.path))
+        if not self.cap.isOpened():
+            raise IOError(f"无法打开视频文件: {self.path}")
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        # 部分容器读不到帧率，退回30fps，避免写出0fps的视频
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # 有些格式只能给出估计值，甚至为0，只用于显示进度
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    @property
+    def size(self):
+        """(宽, 高)，与 cv2.VideoWriter 的参数顺序一致。"""
+        return self.width, self.height
+
+    def read(self):
+        """读取下一帧，返回 (是否成功, 帧)。"""
+        return self.cap.read()
+
+    def __iter__(self):
+        while True:
+            ok, frame = self.cap.read()
+            if not ok:
+                return
+            yield frame
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def describe(self) -> str:
+        return f"{self.width}x{self.height} @ {self.fps:.2f} fps，约 {self.frame_count} 帧"
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# src/ 下的模块以平铺方式互相导入，测试时把它加入搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,32 @@
+import json
+import pytest
+from json2yolo_final_v3 import iter_consolidated_frames
+
+
+def _frames(tmp_path, text, **kwargs):
+    path = tmp_path / "labels.json"
+    path.write_text(text, encoding='utf-8')
+    return list(iter_consolidated_frames(path, **kwargs))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 20])
+def test_elements_split_across_chunks(tmp_path, chunk_size):
+    data = [12345, {"name": "a.jpg", "labels": [{"category": "car"}]}, "x" * 10, [1, 2], True, None, -0.5e3]
+    text = " " * 50 + json.dumps(data, indent=1) + "\n"
+    assert _frames(tmp_path, text, chunk_size=chunk_size) == data
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] ", "\n[\n]\n"])
+def test_empty_array(tmp_path, text):
+    assert _frames(tmp_path, text, chunk_size=2) == []
+
+
+@pytest.mark.parametrize("text", ["[1 2]", "[1,,2]", "[,1]", "[1,]", "[1", "[1,", "{}", ""])
+def test_malformed_input_raises(tmp_path, text):
+    with pytest.raises(ValueError):
+        _frames(tmp_path, text, chunk_size=3)
+
+
+def test_oversized_element_raises(tmp_path):
+    with pytest.raises(ValueError):
+        _frames(tmp_path, '[{"a": "' + "x" * 100, chunk_size=8, max_frame_chars=32)
@@ -0,0 +1,38 @@
+import json
+import numpy as np
+from image_size_cache import ImageSizeCache
+from json2yolo_final_v3 import convert_json_dir
+from packed_labels import PackedLabelStore, parse_yolo_txt
+
+
+def _write_label(json_dir, name, boxes):
+    objects = [{"category": "car", "box2d": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}} for x1, y1, x2, y2 in boxes]
+    with open(json_dir / f"{name}.json", 'w') as f:
+        json.dump({"frames": [{"objects": objects}]}, f)
+
+
+def test_enable_packed_after_incremental_txt_run(tmp_path):
+    json_dir, image_dir, packed_dir = tmp_path / "labels", tmp_path / "images", tmp_path / "labels.packed"
+    json_dir.mkdir()
+    image_dir.mkdir()
+    names = {"a": [(0, 0, 640, 360)], "b": [(100, 100, 200, 300), (640, 0, 1280, 720)], "c": []}
+    for name, boxes in names.items():
+        _write_label(json_dir, name, boxes)
+    size_cache = ImageSizeCache(tmp_path / "sizes.json", fixed_size=(1280, 720))
+
+    # 第一次：增量模式，只写 .txt
+    convert_json_dir(json_dir, image_dir, set(names), size_cache, packed_dir, write_packed=False)
+    assert not packed_dir.exists()
+
+    # 第二次：同样的增量运行，打开打包标签；.json 都没变，但打包标签必须包含所有图片
+    convert_json_dir(json_dir, image_dir, set(names), size_cache, packed_dir, write_packed=True)
+    store = PackedLabelStore(packed_dir)
+    assert sorted(store.names) == sorted(names)
+    for name in names:
+        np.testing.assert_allclose(store[name], parse_yolo_txt(json_dir / f"{name}.txt"), atol=1e-6)
+    assert len(store["b"]) == 2
+    del store
+
+    # 第三次：什么都没变，打包标签保持完整
+    convert_json_dir(json_dir, image_dir, set(names), size_cache, packed_dir, write_packed=True)
+    assert sorted(PackedLabelStore(packed_dir).names) == sorted(names)
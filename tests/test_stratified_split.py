@@ -0,0 +1,29 @@
+import numpy as np
+from class_index import stratified_split
+from split_bdd_dataset import hash_fraction
+
+
+def test_rare_class_gets_its_val_share():
+    # 1000 张只有类别 0 的图片，5 张包含稀有类别 1；
+    # 这个 salt 下稀有类别的哈希值都不小于 0.2，按阈值划分时验证集里一张也没有
+    names = [f"img_{i:04d}" for i in range(1005)]
+    counts = np.zeros((len(names), 2), dtype=np.int64)
+    counts[:, 0] = 1
+    counts[1000:, 1] = 1
+    rare = set(names[1000:])
+
+    train_names, val_names = stratified_split(names, counts, 0.2, lambda n: hash_fraction(n, "a"))
+    assert len(rare & set(val_names)) == 1
+    assert len(set(val_names) - rare) == 200
+    assert sorted(train_names + val_names) == names
+
+    # 确定性：同样的输入得到同样的划分
+    assert stratified_split(names, counts, 0.2, lambda n: hash_fraction(n, "a")) == (train_names, val_names)
+
+
+def test_each_group_is_split_by_hash_rank():
+    names = [f"img_{i:03d}" for i in range(10)]
+    counts = np.ones((len(names), 1), dtype=np.int64)
+    key = lambda n: hash_fraction(n, "rank")
+    _, val_names = stratified_split(names, counts, 0.3, key)
+    assert val_names == sorted(sorted(names, key=key)[:3])